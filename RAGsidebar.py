@@ -1,17 +1,24 @@
 import sys
 import os
 import json
+import contextlib
+import functools
 import shutil
 import subprocess
 import time
+import hashlib
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QWidget, QTabWidget, QLabel, QListWidgetItem, QHBoxLayout, QRadioButton, QSplitter,
-    QLineEdit, QPushButton, QFileDialog, QListWidget, QMessageBox, QCheckBox, QSizePolicy, QDialog, QDialogButtonBox, QTextEdit
+    QLineEdit, QPushButton, QFileDialog, QListWidget, QMessageBox, QCheckBox, QSizePolicy, QDialog, QDialogButtonBox, QTextEdit,
+    QAbstractItemView, QSpinBox, QComboBox
 )
-from PyQt5.QtCore import Qt, QSize, QVariant, pyqtSignal, QObject, QRunnable, QThreadPool
+from PyQt5.QtCore import Qt, QSize, QVariant, pyqtSignal, QObject, QRunnable, QThreadPool, QTimer
 from PyQt5.QtGui import QDragEnterEvent, QDropEvent, QDragMoveEvent
 from PyPDF2 import PdfReader
-import csv
 from langchain_community.embeddings import OllamaEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
@@ -20,10 +27,53 @@ from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain.memory import ConversationBufferMemory
 from langchain_ollama.llms import OllamaLLM
 from tqdm import tqdm
+from build_checkpoint import (
+    BUILD_CHECKPOINT_FILE, add_completed_range, is_chunk_completed, load_build_checkpoint, save_build_checkpoint,
+    update_fingerprint
+)
+from dedup import ChunkDeduplicator
+from file_discovery import discover_files, new_source, parse_globs
+from profiling import profiled, profiling_requested
+from record_readers import iter_csv_chunks, iter_json_chunks
+from context_compaction import CompactingRetriever, CONTEXT_TOKEN_BUDGET
+from federated_search import FederatedRetriever
+from embedding_cache import CachedQueryEmbeddings
+from dim_reduction import (
+    ReducedEmbeddings, load_reduced_embeddings, load_reducer, load_reducer_info, prepare_reduced_embeddings,
+    reducer_from_info
+)
+from speculative import PrefetchingRetriever, RetrievalPrefetcher, SPECULATION_DEBOUNCE_MS
+from packed_index import (
+    PACKED_INDEX_SUFFIX, PackedVectorStore, is_packed_index, iter_chroma_records, read_packed_file_paths, read_packed_info,
+    write_packed_index
+)
+from sharding import (
+    ShardedVectorStore, iter_spooled_chunks, load_shard_manifest, new_manifest, save_shard_manifest, shard_jobs, shard_path,
+    shard_spool_path, spool_shard_chunks
+)
 
 # Initialize the local LLM
 llm_local = OllamaLLM(model="llama3.1")
 
+# Embedding model used to build and query indexes
+EMBEDDING_MODEL = "nomic-embed-text"
+
+# Chunking used when building indexes
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Chunks retrieved per query from a single index (see retrieval_eval.py to tune this and the chunking)
+RETRIEVAL_K = 4
+
+# Source files listed on the console when an index is loaded, and in its info dialog
+MAX_PRINTED_FILES = 50
+
+# Number of index builds allowed to run at the same time
+MAX_CONCURRENT_BUILDS = 1
+# Build job states that still hold or wait for a slot; "pausing" keeps its slot until the job parks
+ACTIVE_BUILD_STATES = ("queued", "running", "pausing", "paused")
+# Number of shards of one index built at the same time
+MAX_PARALLEL_SHARD_BUILDS = os.cpu_count() or 1
+
 # Function to process files
 def process_pdf(file_path):
     pdf = PdfReader(file_path)
@@ -36,77 +86,447 @@ def process_txt(file_path):
     with open(file_path, "r", encoding="utf-8") as f:
         return f.read()
 
-def process_csv(file_path):
-    csv_text = ""
-    with open(file_path, "r", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        for row in reader:
-            csv_text += " ".join(row) + "\n"
-    return csv_text
+def split_oversized_record(record, max_size):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=max_size, chunk_overlap=min(CHUNK_OVERLAP, max_size // 5))
+    return splitter.split_text(record)
 
-def process_json(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return json.dumps(data, indent=2)
+def iter_chunks(file_paths, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Yield the text chunks to embed from ``file_paths`` as ``(chunk, source file)`` pairs.
 
-def process_files(file_paths):
-    combined_text = ""
+    CSV and JSON/JSONL files are streamed record by record and packed into
+    chunks of whole rows or objects (CSV chunks repeat the header row), so
+    they are never loaded or re-serialised whole. PDF and text files are
+    split with RecursiveCharacterTextSplitter. Files are read one at a time,
+    as the chunks are consumed.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     for file_path in file_paths:
-        if file_path.lower().endswith(".pdf"):
-            combined_text += process_pdf(file_path)
-        elif file_path.lower().endswith(".txt"):
-            combined_text += process_txt(file_path)
-        elif file_path.lower().endswith(".csv"):
-            combined_text += process_csv(file_path)
-        elif file_path.lower().endswith(".json"):
-            combined_text += process_json(file_path)
-        combined_text += "\n\n"
-    return combined_text
-
-def create_vector_store(text, index_path, file_paths):
+        lower_path = file_path.lower()
+        if lower_path.endswith(".pdf"):
+            chunks = text_splitter.split_text(process_pdf(file_path))
+        elif lower_path.endswith(".txt"):
+            chunks = text_splitter.split_text(process_txt(file_path))
+        elif lower_path.endswith(".csv"):
+            chunks = iter_csv_chunks(file_path, chunk_size, split_oversized_record)
+        elif lower_path.endswith((".json", ".jsonl", ".ndjson")):
+            chunks = iter_json_chunks(file_path, chunk_size, split_oversized_record)
+        else:
+            continue
+        for chunk in chunks:
+            yield chunk, file_path
+
+def process_files(file_paths, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Return the text chunks of ``file_paths`` as a list; builds stream them with iter_chunks instead."""
+    return [chunk for chunk, _ in iter_chunks(file_paths, chunk_size, chunk_overlap)]
+
+def iter_source_files(source, file_paths, job=None):
+    """Yield the files of a directory ``source`` as they are found, appending each to ``file_paths``.
+
+    Discovery counts are shown on ``job``; if it is cancelled mid-walk,
+    BuildCancelled is raised once the walk has stopped.
+    """
+    def on_progress(found, scanned):
+        if job is not None:
+            job.report_status(f"found {found} files in {scanned} folders")
+
+    for file_path in discover_files(source, job=job, on_progress=on_progress):
+        file_paths.append(file_path)
+        yield file_path
+    if job is not None and job.is_cancelled():
+        raise BuildCancelled("file discovery")
+
+# Chunks read, deduplicated and embedded at a time; the build checkpoints after every batch
+BUILD_BATCH_SIZE = 32
+DEDUP_MAP_FILE = "dedup_map.json"
+DEDUP_STATE_FILE = "dedup_state.sqlite"
+
+class BuildCancelled(Exception):
+    """Raised inside a build when its job has been cancelled."""
+
+class ChunksChanged(Exception):
+    """Raised when a resumed build finds its chunks no longer match its checkpoint."""
+
+def check_job(job, what):
+    """Block while ``job`` is paused and raise BuildCancelled if it was cancelled; a no-op without a job."""
+    if job is not None:
+        job.wait_if_paused()
+        if job.is_cancelled():
+            raise BuildCancelled(what)
+
+def with_job_checks(items, job, what, every=BUILD_BATCH_SIZE):
+    """Yield ``items``, calling check_job every ``every`` items, for passes that do not embed anything."""
+    for i, item in enumerate(items):
+        if i % every == 0:
+            check_job(job, what)
+        yield item
+
+def save_dedup_map(index_path, deduplicator):
+    """Record which kept chunk each dropped duplicate resolves to, keyed by chunk source.
+
+    Each entry also names the file the dropped chunk and its canonical chunk
+    came from, so dropped copies stay attributable.
+    """
+    dedup_map = {
+        "stats": deduplicator.stats(),
+        "duplicates": {f"{dropped}-pl": {"duplicate_of": f"{canonical}-pl", "file": file, "canonical_file": canonical_file}
+                       for dropped, canonical, file, canonical_file in deduplicator.duplicates()},
+    }
+    with open(os.path.join(index_path, DEDUP_MAP_FILE), "w") as f:
+        json.dump(dedup_map, f)
+
+def print_dedup_stats(stats):
+    print(f"Dedup: kept {stats['kept_chunks']} of {stats['total_chunks']} chunks "
+          f"({stats['exact_duplicates']} exact, {stats['near_duplicates']} near duplicates dropped)")
+
+def drop_duplicates(chunks, deduplicator):
+    """Yield the ``(text, source file)`` pairs of ``chunks`` that ``deduplicator`` keeps."""
+    for i, (text, chunk_file) in enumerate(chunks):
+        if deduplicator.add(i, text, chunk_file) is None:
+            yield text, chunk_file
+
+def create_vector_store(chunks, index_path, file_paths, job=None, embeddings=None, deduplicate=True):
+    """Embed chunks into a Chroma index at ``index_path``; returns the dedup stats.
+
+    ``chunks`` is called to get the chunks as ``(text, source file)`` pairs
+    (see iter_chunks). They are read, deduplicated and embedded
+    ``BUILD_BATCH_SIZE`` at a time, so only one batch of text is in memory.
+    Exact and near-duplicate chunks are dropped before embedding (unless
+    ``deduplicate`` is False, for chunks deduplicated already); the mapping
+    from each dropped chunk to its canonical chunk and the dedup stats are
+    written to ``DEDUP_MAP_FILE`` at the end.
+    Progress is checkpointed after every batch together with a running hash
+    of the chunks read so far and the dedup state (``DEDUP_STATE_FILE``). A
+    resumed build reads the chunks again and skips the ones already embedded
+    and deduplicated, but only trusts the checkpoint if they still hash the
+    same; otherwise the collection and dedup state are cleared and
+    ``chunks`` is called again to start over.
+    ``file_paths`` may still be growing while the chunks are read (files
+    found by a folder walk); the checkpoint records it as it is so far.
+    ``job`` is the optional BuildJob driving the build; it receives progress
+    and is polled for pause and cancel requests between batches. ``embeddings``
+    overrides the default embedding function (e.g. with dimension reduction).
+    """
     try:
-        start_time = time.time()
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        texts = text_splitter.split_text(text)
-        metadatas = [{"source": f"{i}-pl"} for i in range(len(texts))]
-        pbar = tqdm(total=len(texts), desc="Creating vector store", unit="chunk")
-        embeddings = OllamaEmbeddings(model="nomic-embed-text")
-        for i, chunk in enumerate(texts):
-            docsearch = Chroma.from_texts([chunk], embeddings, metadatas=[metadatas[i]], persist_directory=index_path)
-            pbar.update(1)
-            elapsed_time = time.time() - start_time
-            time_per_chunk = elapsed_time / (i + 1)
-            estimated_total_time = time_per_chunk * len(texts)
-            time_remaining = estimated_total_time - elapsed_time
-            pbar.set_postfix(time_remaining=f"{time_remaining:.2f}s")
-        with open(os.path.join(index_path, "file_paths.json"), "w") as f:
-            json.dump(file_paths, f)
-        pbar.close()
+        if embeddings is None:
+            embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
+        checkpoint = load_build_checkpoint(index_path)
+        if checkpoint is not None and "fingerprint" in checkpoint:
+            try:
+                return _embed_chunks(chunks(), index_path, file_paths, checkpoint, job, embeddings, deduplicate)
+            except ChunksChanged:
+                print(f"The sources of {index_path} changed since its build was interrupted; starting over")
+        # Nothing trustworthy embedded yet: drop anything there is and start over,
+        # keeping the build options recorded when the build was queued
+        Chroma(persist_directory=index_path, embedding_function=embeddings).delete_collection()
+        if os.path.exists(os.path.join(index_path, DEDUP_STATE_FILE)):
+            os.remove(os.path.join(index_path, DEDUP_STATE_FILE))
+        checkpoint = dict(checkpoint or {}, completed=[], chunks_read=0, fingerprint=hashlib.sha1().hexdigest())
+        save_build_checkpoint(index_path, checkpoint)
+        return _embed_chunks(chunks(), index_path, file_paths, checkpoint, job, embeddings, deduplicate)
+    except BuildCancelled:
+        print(f"Vector store build cancelled, checkpoint kept in {index_path}")
+        raise
     except Exception as e:
         print(f"Error creating vector store: {e}")
         raise
 
-def load_vector_store(index_path):
-    embeddings = OllamaEmbeddings(model="nomic-embed-text")
+def _embed_chunks(chunks, index_path, file_paths, checkpoint, job, embeddings, deduplicate=True):
+    """The batch loop of create_vector_store, resuming from ``checkpoint``."""
     docsearch = Chroma(persist_directory=index_path, embedding_function=embeddings)
+    checkpoint["file_paths"] = file_paths
+    completed = checkpoint["completed"]
+    resume_at = checkpoint["chunks_read"]
+    fingerprint = hashlib.sha1()
+    state_path = os.path.join(index_path, DEDUP_STATE_FILE)
+    # The saved dedup state already covers the chunks the checkpoint does; without one
+    # (e.g. a checkpoint from before it was kept) it is rebuilt from the chunks read again
+    dedup_from = resume_at if os.path.exists(state_path) else 0
+    deduplicator = ChunkDeduplicator(state_path) if deduplicate else None
+    if deduplicator is not None:
+        # Drop whatever was added after the last checkpoint, which is read again
+        deduplicator.truncate(dedup_from)
+
+    start_time = time.time()
+    pbar = tqdm(desc="Creating vector store", unit="chunk")
+    chunks = iter(chunks)
+    position = 0
+    embedded_this_run = 0
+    files_started = 0
+    last_file = None
+    try:
+        while True:
+            check_job(job, index_path)  # The checkpoint already covers every finished batch
+            batch = list(itertools.islice(chunks, BUILD_BATCH_SIZE))
+            if not batch:
+                break
+            texts, metadatas, ids = [], [], []
+            for i, (text, chunk_file) in enumerate(batch, position):
+                update_fingerprint(fingerprint, text)
+                if chunk_file != last_file:
+                    files_started += 1
+                    last_file = chunk_file
+                # Chunks before dedup_from were deduplicated before the build was interrupted
+                if deduplicator is None or i < dedup_from:
+                    duplicate = None
+                else:
+                    duplicate = deduplicator.add(i, text, chunk_file)
+                if duplicate is None and not is_chunk_completed(completed, i):
+                    texts.append(text)
+                    metadatas.append({"source": f"{i}-pl", "chunk": i, "file": chunk_file})
+                    # Stable ids make re-embedding a chunk after a crash an upsert, not a duplicate.
+                    ids.append(f"chunk-{i}")
+                if i + 1 == resume_at and fingerprint.hexdigest() != checkpoint["fingerprint"]:
+                    raise ChunksChanged(index_path)
+            if texts:
+                docsearch.add_texts(texts, metadatas=metadatas, ids=ids)
+            if deduplicator is not None:
+                deduplicator.commit()  # Before the checkpoint, so the state never lags behind it
+            batch_start, position = position, position + len(batch)
+            if position > resume_at:
+                checkpoint["completed"] = completed = add_completed_range(completed, batch_start, position)
+                checkpoint["chunks_read"] = position
+                checkpoint["fingerprint"] = fingerprint.hexdigest()
+                save_build_checkpoint(index_path, checkpoint)
+
+            embedded_this_run += len(texts)
+            pbar.update(len(batch))
+            if embedded_this_run:
+                pbar.set_postfix(time_per_chunk=f"{(time.time() - start_time) / embedded_this_run:.2f}s")
+            if job is not None:
+                # Files before the one being read are done; the total is only known once a folder walk has finished
+                job.report_progress(int((files_started - 1) * 100 / max(len(file_paths), 1)))
+        if position < resume_at:
+            raise ChunksChanged(index_path)
+
+        if deduplicator is not None:
+            save_dedup_map(index_path, deduplicator)
+            stats = deduplicator.stats()
+            print_dedup_stats(stats)
+        else:
+            stats = {"total_chunks": position, "kept_chunks": position, "exact_duplicates": 0, "near_duplicates": 0}
+        with open(os.path.join(index_path, "file_paths.json"), "w") as f:
+            json.dump(file_paths, f)
+        os.remove(os.path.join(index_path, BUILD_CHECKPOINT_FILE))
+        if deduplicator is not None:
+            deduplicator.close()
+            os.remove(state_path)  # Only an unfinished build needs its dedup state
+        if job is not None:
+            job.report_progress(100)
+        return stats
+    finally:
+        pbar.close()
+        if deduplicator is not None:
+            deduplicator.close()
+
+def create_sharded_vector_store(index_path, file_paths, num_shards, strategy, job=None, only_shard=None, reduction=None):
+    """Build the index at ``index_path`` as ``num_shards`` independent Chroma shards.
+
+    With the "file" strategy whole files are spread over the shards by size,
+    and duplicates are only dropped within each shard. With "hash" every
+    chunk goes to the shard picked by its hash; duplicates are dropped across
+    the whole index before the chunks are partitioned, and the dedup map is
+    kept at the top of the index, numbering chunks in source order. Shards are
+    built in parallel, each with its own checkpoint, and their status is
+    tracked in the shard manifest so a resumed build only redoes unfinished
+    shards. ``only_shard`` restricts the build to one shard (see rebuild_shard).
+    A ``reduction`` is fitted once for the whole index and shared by every shard.
+    """
+    manifest = load_shard_manifest(index_path)
+    if manifest is None:
+        manifest = new_manifest(file_paths, num_shards, strategy)
+        save_shard_manifest(index_path, manifest)
+    num_shards = manifest["num_shards"]
+    pending = [(shard_index, shard) for shard_index, shard in enumerate(manifest["shards"])
+               if shard["status"] != "complete" and only_shard in (None, shard["name"])]
+
+    if manifest["strategy"] == "hash" and pending:
+        # One pass over the sources spools each pending shard's chunks to its own file,
+        # rather than holding every partition in memory until its shard is built
+        spool_paths = {shard_index: shard_spool_path(index_path, shard["name"]) for shard_index, shard in pending}
+        # Deduplicating before partitioning catches copies that would land in different shards
+        state_path = os.path.join(index_path, DEDUP_STATE_FILE)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        deduplicator = ChunkDeduplicator(state_path)
+        try:
+            chunks = with_job_checks(iter_chunks(manifest["file_paths"]), job, index_path)
+            spool_shard_chunks(drop_duplicates(chunks, deduplicator), spool_paths, num_shards)
+            deduplicator.commit()
+            save_dedup_map(index_path, deduplicator)
+            print_dedup_stats(deduplicator.stats())
+        finally:
+            deduplicator.close()
+            os.remove(state_path)
+
+    base_embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
+    embeddings = load_reduced_embeddings(index_path, base_embeddings)
+    if reduction is not None and embeddings is base_embeddings and pending:
+        if manifest["strategy"] == "hash":
+            sample_texts = (chunk for path in spool_paths.values() for chunk, _ in iter_spooled_chunks(path))
+        else:
+            # Sample across the files of every pending shard, not just the first of each
+            sample_texts = (text for text, _ in iter_chunks([path for _, shard in pending
+                                                             for path in shard["file_paths"]]))
+        embeddings = prepare_reduced_embeddings(index_path, reduction["method"], reduction["dim"],
+                                                with_job_checks(sample_texts, job, index_path), base_embeddings,
+                                                check=functools.partial(check_job, job, index_path))
+
+    manifest_lock = threading.Lock()
+
+    def build_shard(item):
+        shard_job, (shard_index, shard) = item
+        if manifest["strategy"] == "hash":
+            chunks = functools.partial(iter_spooled_chunks, spool_paths[shard_index])
+        else:
+            chunks = functools.partial(iter_chunks, shard["file_paths"])
+        path = shard_path(index_path, shard["name"])
+        os.makedirs(path, exist_ok=True)
+        with shard_job.working():
+            stats = create_vector_store(chunks, path, shard["file_paths"], job=shard_job, embeddings=embeddings,
+                                        deduplicate=manifest["strategy"] != "hash")
+        if manifest["strategy"] == "hash":
+            os.remove(spool_paths[shard_index])
+        with manifest_lock:
+            shard["status"] = "complete"
+            shard["chunks"] = stats["total_chunks"]
+            save_shard_manifest(index_path, manifest)
+
+    workers = max(1, min(len(pending), MAX_PARALLEL_SHARD_BUILDS))
+    # This thread only waits for the shard threads, so pausing the job need not wait for it to park
+    with ThreadPoolExecutor(max_workers=workers) as executor, \
+            (job.waiting_on_workers() if job is not None else contextlib.nullcontext()):
+        list(executor.map(build_shard, zip(shard_jobs(job, len(pending)), pending)))
+
+    with open(os.path.join(index_path, "file_paths.json"), "w") as f:
+        json.dump(manifest["file_paths"], f)
+    if os.path.exists(os.path.join(index_path, BUILD_CHECKPOINT_FILE)):
+        os.remove(os.path.join(index_path, BUILD_CHECKPOINT_FILE))
+
+def rebuild_shard(index_path, name, job=None):
+    """Throw away one shard of a sharded index and build it again from its files."""
+    manifest = load_shard_manifest(index_path)
+    for shard in manifest["shards"]:
+        if shard["name"] == name:
+            shard["status"] = "pending"
+    save_shard_manifest(index_path, manifest)
+    shutil.rmtree(shard_path(index_path, name), ignore_errors=True)
+    create_sharded_vector_store(index_path, manifest["file_paths"], manifest["num_shards"],
+                                manifest["strategy"], job=job, only_shard=name)
+
+def load_dedup_stats(index_path):
+    """Return the dedup stats of an index, summed over its shards if it has any.
+
+    Hash-sharded indexes keep one dedup map for the whole index at the top;
+    file-sharded ones keep one per shard.
+    """
+    manifest = load_shard_manifest(index_path)
+    paths = [index_path] + ([shard_path(index_path, shard["name"]) for shard in manifest["shards"]] if manifest else [])
+    totals = None
+    for path in paths:
+        dedup_map_json = os.path.join(path, DEDUP_MAP_FILE)
+        if not os.path.exists(dedup_map_json):
+            continue
+        with open(dedup_map_json, "r") as f:
+            stats = json.load(f)["stats"]
+        totals = stats if totals is None else {key: totals[key] + stats[key] for key in totals}
+    return totals
+
+def load_index_file_paths(index_path):
+    """Return the source files recorded for an index, or None if there is no record."""
+    if is_packed_index(index_path):
+        return read_packed_file_paths(index_path)
     file_paths_json = os.path.join(index_path, "file_paths.json")
-    if os.path.exists(file_paths_json):
-        with open(file_paths_json, "r") as f:
-            file_paths = json.load(f)
-            print("The following files were used to create this semantic index:")
-            for file_path in file_paths:
-                print(f"- {file_path}")
+    if not os.path.exists(file_paths_json):
+        return None
+    with open(file_paths_json, "r") as f:
+        return json.load(f)
+
+def export_packed_index(index_path, pack_path):
+    """Write a Chroma index (sharded or not) to a single packed index file."""
+    reducer = load_reducer(index_path)
+    embeddings = load_reduced_embeddings(index_path, OllamaEmbeddings(model=EMBEDDING_MODEL))
+    manifest = load_shard_manifest(index_path)
+    if manifest is not None:
+        stores = [(shard["name"], Chroma(persist_directory=shard_path(index_path, shard["name"]), embedding_function=embeddings))
+                  for shard in manifest["shards"]]
+    else:
+        stores = [(None, Chroma(persist_directory=index_path, embedding_function=embeddings))]
+
+    def records():
+        for name, store in stores:
+            for embedding, text, metadata in iter_chroma_records(store):
+                if name is not None:
+                    metadata = dict(metadata, shard=name)
+                yield embedding, text, metadata
+
+    info = {
+        "name": os.path.basename(index_path),
+        "embedding_model": EMBEDDING_MODEL,
+        "dedup_stats": load_dedup_stats(index_path),
+        "dim_reduction": reducer.to_info() if reducer is not None else None,
+        "dim_reduction_stats": (load_reducer_info(index_path) or {}).get("stats"),
+    }
+    # The file list and PCA projection go in their own raw blocks, so opening the pack stays cheap
+    projection = (reducer.mean, reducer.components) if reducer is not None and reducer.method == "pca" else None
+    count = write_packed_index(pack_path, records(), info, load_index_file_paths(index_path) or [], projection)
+    print(f"Exported {count} chunks from {index_path} to {pack_path}")
+    return pack_path
+
+def import_packed_index(pack_path):
+    """Copy a packed index file into chroma_indexes so it can be queried directly."""
+    read_packed_info(pack_path)  # Fail early on anything that is not a valid pack
+    index_path = os.path.join("chroma_indexes", os.path.basename(pack_path))
+    if os.path.exists(index_path):
+        raise FileExistsError(f"Index '{os.path.basename(pack_path)}' already exists.")
+    shutil.copyfile(pack_path, index_path + ".tmp")
+    os.replace(index_path + ".tmp", index_path)
+    return os.path.basename(index_path)
+
+def load_vector_store(index_path):
+    manifest = None if is_packed_index(index_path) else load_shard_manifest(index_path)
+    if is_packed_index(index_path):
+        docsearch = PackedVectorStore(index_path)
+        info = docsearch.info
+        embeddings = CachedQueryEmbeddings(OllamaEmbeddings(model=info.get("embedding_model", EMBEDDING_MODEL)))
+        reducer = reducer_from_info(info.get("dim_reduction"), docsearch.projection)
+        if reducer is not None:
+            embeddings = ReducedEmbeddings(embeddings, reducer)
+        docsearch.embeddings = embeddings
+    elif manifest is not None:
+        # Shards share one embeddings object so each query is embedded once
+        embeddings = load_reduced_embeddings(index_path, CachedQueryEmbeddings(OllamaEmbeddings(model=EMBEDDING_MODEL)))
+        names = [shard["name"] for shard in manifest["shards"]]
+        with ThreadPoolExecutor(max_workers=max(1, len(names))) as executor:
+            shards = executor.map(
+                lambda name: Chroma(persist_directory=shard_path(index_path, name), embedding_function=embeddings), names)
+            docsearch = ShardedVectorStore(dict(zip(names, shards)), embeddings)
+    else:
+        embeddings = load_reduced_embeddings(index_path, CachedQueryEmbeddings(OllamaEmbeddings(model=EMBEDDING_MODEL)))
+        docsearch = Chroma(persist_directory=index_path, embedding_function=embeddings)
+    file_paths = docsearch.file_paths() if isinstance(docsearch, PackedVectorStore) else load_index_file_paths(index_path)
+    if file_paths is not None:
+        print("The following files were used to create this semantic index:")
+        for file_path in file_paths[:MAX_PRINTED_FILES]:
+            print(f"- {file_path}")
+        if len(file_paths) > MAX_PRINTED_FILES:
+            print(f"... and {len(file_paths) - MAX_PRINTED_FILES} more")
     else:
         print("No record of files found for this index.")
     return docsearch
 
-def create_conversational_chain(docsearch):
+def load_vector_stores(index_paths):
+    """Load several indexes concurrently; returns {index_path: docsearch}."""
+    with ThreadPoolExecutor(max_workers=max(1, len(index_paths))) as executor:
+        return dict(zip(index_paths, executor.map(load_vector_store, index_paths)))
+
+def create_conversational_chain(retriever, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Build the QA chain; retrieved chunks are compacted to ``token_budget`` tokens."""
     message_history = ChatMessageHistory()
     memory = ConversationBufferMemory(memory_key="chat_history", output_key="answer", chat_memory=message_history, return_messages=True)
     chain = ConversationalRetrievalChain.from_llm(
         llm=llm_local,
         chain_type="stuff",
-        retriever=docsearch.as_retriever(),
+        retriever=CompactingRetriever(base_retriever=retriever, token_budget=token_budget),
         memory=memory,
         return_source_documents=True,
     )
@@ -140,34 +560,47 @@ def handle_tasks(query):
     # More tasks can be added here
 
     return None  # If no task is detected, return None
-def query_chain(chain, query, chatbox):
+def build_question(query):
+    """Wrap ``query`` in the prompt sent to the chain; with no chat history it is also the retrieval query."""
+    return f"""Answer the following question:\n\n{query}\n\nProvide a direct and accurate response based on the information available."""
+
+def handle_tasks_match(query):
+    """Whether ``query`` is one of the tasks handled by handle_tasks instead of the chain."""
+    return "list files in directory" in query.lower() or "create a file named" in query.lower()
+
+def query_chain(chain, query):
+    """Run ``query`` through ``chain`` and return the text to show in the chatbox.
+
+    This runs on a worker thread, so it must not touch any widgets; the caller
+    delivers the returned text to the GUI thread through a signal.
+    """
     try:
         task_result = handle_tasks(query)
         if task_result:
-            chatbox.append(f"Task Result: {task_result}\n")
-            return
+            return f"Task Result: {task_result}\n"
 
-        modified_query = f"""Answer the following question:\n\n{query}\n\nProvide a direct and accurate response based on the information available."""
-        res = chain.invoke({"question": modified_query})
+        res = chain.invoke({"question": build_question(query)})
         answer = res.get("answer", "")
         source_documents = res.get("source_documents", [])
 
-        chatbox.append(f"Query: {query}\n")
-        chatbox.append(f"Answer: {answer}\n")
+        lines = [f"Query: {query}\n", f"Answer: {answer}\n"]
 
         if source_documents:
             for idx, doc in enumerate(source_documents):
-                chatbox.append(f"Source {idx + 1}: {doc.page_content[:200]}...\n")
+                origin = f" ({os.path.basename(doc.metadata['file'])})" if doc.metadata.get("file") else ""
+                lines.append(f"Source {idx + 1}{origin}: {doc.page_content[:200]}...\n")
 
         chain.memory.clear()  # Wipe chat memory after each query
+        return "\n".join(lines)
     except Exception as e:
-        chatbox.append(f"Error querying chain: {e}\n")
         print(f"Error querying chain: {e}")
+        return f"Error querying chain: {e}\n"
 
 class WorkerSignals(QObject):
     finished = pyqtSignal()
     result = pyqtSignal(object)
     progress = pyqtSignal(int)
+    error = pyqtSignal(str)
 
 class Worker(QRunnable):
     def __init__(self, fn, *args, **kwargs):
@@ -178,11 +611,227 @@ class Worker(QRunnable):
         self.signals = WorkerSignals()
 
     def run(self):
-        result = self.fn(*self.args, **self.kwargs)
-        self.signals.result.emit(result)
-        self.signals.finished.emit()
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+            self.signals.result.emit(result)
+        except Exception as e:
+            print(f"Error in worker: {e}")
+            self.signals.error.emit(str(e))
+        finally:
+            self.signals.finished.emit()
+
+class BuildJobSignals(WorkerSignals):
+    parked = pyqtSignal()
+
+class BuildJob(QRunnable):
+    """A cancellable, pausable index build run by BuildScheduler.
+
+    ``fn`` is called as ``fn(job, *args, **kwargs)`` so it can report progress
+    and poll for pause/cancel requests between units of work. Once a paused
+    job's working threads are all blocked in wait_if_paused it emits
+    ``signals.parked``; a job built on several threads registers each with
+    working().
+    """
+    def __init__(self, index_name, fn, *args, priority=0, **kwargs):
+        super(BuildJob, self).__init__()
+        self.setAutoDelete(False)
+        self.index_name = index_name
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = BuildJobSignals()
+        self.state = "queued"
+        self.progress = 0
+        self.status = ""
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._lock = threading.Lock()
+        self._working = 0  # Threads doing the job's work
+        self._waiting = 0  # Of those, the ones blocked in wait_if_paused
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()  # Wake a paused job so it can notice the cancel
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def is_paused(self):
+        return not self._running.is_set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def is_parked(self):
+        """Whether the job is paused and none of its threads is still working."""
+        with self._lock:
+            return self.is_paused() and self._waiting >= self._working
+
+    def wait_if_paused(self):
+        if self._running.is_set():
+            return
+        with self._lock:
+            self._waiting += 1
+            parked = self._waiting >= self._working
+        if parked:
+            self.signals.parked.emit()
+        self._running.wait()
+        with self._lock:
+            self._waiting -= 1
+
+    def _add_workers(self, count):
+        with self._lock:
+            self._working += count
+            parked = self._working > 0 and self._waiting >= self._working
+        if parked and self.is_paused():
+            self.signals.parked.emit()  # The threads left are all waiting
+
+    @contextlib.contextmanager
+    def working(self):
+        """Count the calling thread as working on the job while the block runs."""
+        self._add_workers(1)
+        try:
+            yield
+        finally:
+            self._add_workers(-1)
+
+    @contextlib.contextmanager
+    def waiting_on_workers(self):
+        """Stop counting the calling thread while it only waits for others, e.g. shards built in parallel."""
+        self._add_workers(-1)
+        try:
+            yield
+        finally:
+            self._add_workers(1)
+
+    def report_progress(self, percent):
+        self.progress = percent
+        self.signals.progress.emit(percent)
+
+    def report_status(self, text):
+        """Show ``text`` next to the job's progress (e.g. file discovery counts)."""
+        self.status = text
+        self.signals.progress.emit(self.progress)
+
+    def run(self):
+        try:
+            with self.working():
+                result = self.fn(self, *self.args, **self.kwargs)
+            self.state = "finished"
+            self.signals.result.emit(result)
+        except BuildCancelled:
+            self.state = "cancelled"
+        except Exception as e:
+            self.state = "failed"
+            self.signals.error.emit(str(e))
+        finally:
+            self.signals.finished.emit()
+
+class BuildScheduler(QObject):
+    """Priority queue for index builds with a limit on concurrent builds.
+
+    Pausing a build gives up its slot once the build has actually stopped
+    ("pausing" until then), so a queued build can start in its place;
+    resuming puts it back in the queue by priority, and it carries on from
+    where it stopped once a slot is free. A paused build keeps its thread, so
+    builds get a thread pool of their own that grows to fit them.
+    """
+    job_changed = pyqtSignal(object)
+    idle = pyqtSignal()
+
+    def __init__(self, threadpool, max_concurrent=MAX_CONCURRENT_BUILDS, parent=None):
+        super().__init__(parent)
+        self.threadpool = threadpool
+        self.max_concurrent = max_concurrent
+        self.jobs = []
+        self._queue = []
+        self._running = []
+        self._sequence = itertools.count()
+
+    def submit(self, job):
+        self.jobs.append(job)
+        heapq.heappush(self._queue, (-job.priority, next(self._sequence), job))
+        job.signals.progress.connect(lambda _, j=job: self.job_changed.emit(j))
+        job.signals.parked.connect(lambda j=job: self._on_job_parked(j))
+        job.signals.finished.connect(lambda j=job: self._on_job_finished(j))
+        self.job_changed.emit(job)
+        self._dispatch()
+
+    def cancel(self, job):
+        if job.state == "queued":
+            job.cancel()
+            job.state = "cancelled"
+            self.job_changed.emit(job)
+            self._check_idle()
+        elif job.state in ("running", "pausing", "paused"):
+            job.cancel()
+
+    def toggle_pause(self, job):
+        if job.state == "running":
+            # The slot is only given up once the job parks at its next pause check (see _on_job_parked)
+            job.pause()
+            job.state = "pausing"
+            self.job_changed.emit(job)
+        elif job.state == "pausing":
+            job.resume()  # Not parked yet, so it simply carries on in its slot
+            job.state = "running"
+            self.job_changed.emit(job)
+        elif job.state == "paused":
+            # Wait for a free slot; the job's thread stays parked until then
+            job.state = "queued"
+            heapq.heappush(self._queue, (-job.priority, next(self._sequence), job))
+            self.job_changed.emit(job)
+            self._dispatch()
+
+    def has_active_jobs(self):
+        return any(job.state in ACTIVE_BUILD_STATES for job in self.jobs)
+
+    def _dispatch(self):
+        while self._queue and len(self._running) < self.max_concurrent:
+            _, _, job = heapq.heappop(self._queue)
+            if job.is_cancelled() or job.state != "queued":
+                continue  # Cancelled, or a paused job that finished before it could stop
+            job.state = "running"
+            self._running.append(job)
+            self.job_changed.emit(job)
+            if job.is_paused():
+                job.resume()  # Re-admitted after a pause
+            else:
+                # Parked jobs still hold their threads; make sure this one does not queue behind them
+                started = sum(1 for other in self.jobs if other.state in ("running", "pausing", "paused")
+                              or (other.state == "queued" and other.is_paused()))
+                if self.threadpool.maxThreadCount() < started:
+                    self.threadpool.setMaxThreadCount(started)
+                self.threadpool.start(job)
+
+    def _on_job_parked(self, job):
+        if job.state != "pausing" or not job.is_parked():
+            return  # Resumed or cancelled since, or another of its threads is still working
+        job.state = "paused"
+        if job in self._running:
+            self._running.remove(job)
+        self.job_changed.emit(job)
+        self._dispatch()
+
+    def _on_job_finished(self, job):
+        if job in self._running:
+            self._running.remove(job)
+        self.job_changed.emit(job)
+        self._dispatch()
+        self._check_idle()
+
+    def _check_idle(self):
+        if not self.has_active_jobs():
+            self.idle.emit()
 
 class FileListWidget(QListWidget):
+    directories_dropped = pyqtSignal(list)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setAcceptDrops(True)
@@ -196,9 +845,15 @@ class FileListWidget(QListWidget):
 
     def dropEvent(self, event: QDropEvent):
         urls = event.mimeData().urls()
+        directories = []
         for url in urls:
             file_path = url.toLocalFile()
-            self.addItem(file_path)
+            if os.path.isdir(file_path):
+                directories.append(file_path)  # Walked at build time rather than listed here
+            else:
+                self.addItem(file_path)
+        if directories:
+            self.directories_dropped.emit(directories)
         event.acceptProposedAction()
 
 from PyQt5.QtWidgets import QListWidgetItem, QHBoxLayout, QWidget, QPushButton, QLabel, QVBoxLayout, QLineEdit, QFileDialog, QMessageBox, QTabWidget, QListWidget
@@ -207,8 +862,19 @@ class RAGSidebar(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.parent_widget = parent
-        self.init_ui()
         self.threadpool = QThreadPool()
+        # Builds get their own pool, so parked builds never hold up queries, loads or exports
+        self.build_threadpool = QThreadPool()
+        self.build_scheduler = BuildScheduler(self.build_threadpool, parent=self)
+        self.build_scheduler.job_changed.connect(self._update_build_job_item)
+        self.build_scheduler.idle.connect(self._on_builds_idle)
+        self.build_job_items = {}
+        self.prefetcher = RetrievalPrefetcher()
+        self.speculation_generation = 0
+        self._loading = set()  # Index paths being loaded
+        self._load_waiters = []  # (index paths, callback, show_loading) waiting on loads
+        self.builds_completed = []
+        self.init_ui()
 
     def delete_index(self, index_name):
         """Handle the delete button click by restarting the application."""
@@ -248,7 +914,10 @@ class RAGSidebar(QWidget):
         if index_name:
             index_path = os.path.join("chroma_indexes", index_name)
             try:
-                shutil.rmtree(index_path)
+                if os.path.isfile(index_path):
+                    os.remove(index_path)  # Packed single-file index
+                else:
+                    shutil.rmtree(index_path)
                 QMessageBox.information(None, "Success", f"Index '{index_name}' deleted successfully.")
             except Exception as e:
                 QMessageBox.critical(None, "Error", f"Failed to delete index '{index_name}': {e}")
@@ -261,7 +930,8 @@ class RAGSidebar(QWidget):
         self.query_input.clear()
         self.index_list.clear()
         self.status_label.setText("")
-        self.docsearch = None
+        self.vector_stores = {}
+        self.prefetcher.clear()
 
     def restart_app(self):
         """Restart the application by re-launching it."""
@@ -296,17 +966,107 @@ class RAGSidebar(QWidget):
         self.rag_layout.addWidget(self.browse_button)
         
         self.file_list = FileListWidget()
+        self.file_list.directories_dropped.connect(self.add_source_folders)
+        self.file_list.model().rowsInserted.connect(self._update_source_summary)
         self.rag_layout.addWidget(self.file_list)
+
+        folder_buttons = QHBoxLayout()
+        self.add_folder_button = QPushButton("Add Folder")
+        self.add_folder_button.clicked.connect(self.browse_folder)
+        folder_buttons.addWidget(self.add_folder_button)
+        self.clear_sources_button = QPushButton("Clear Files and Folders")
+        self.clear_sources_button.clicked.connect(self.clear_sources)
+        folder_buttons.addWidget(self.clear_sources_button)
+        self.rag_layout.addLayout(folder_buttons)
+
+        # Folders are only listed here; their files are found by the build itself
+        self.folder_list = QListWidget()
+        self.folder_list.setMaximumHeight(60)
+        self.rag_layout.addWidget(self.folder_list)
+
+        self.include_globs_input = QLineEdit()
+        self.include_globs_input.setPlaceholderText("Include only (e.g. *.pdf; reports/*)")
+        self.rag_layout.addWidget(self.include_globs_input)
+        self.exclude_globs_input = QLineEdit()
+        self.exclude_globs_input.setPlaceholderText("Exclude (e.g. .git; node_modules; *draft*)")
+        self.rag_layout.addWidget(self.exclude_globs_input)
+
+        source_options = QHBoxLayout()
+        source_options.addWidget(QLabel("Max file size:"))
+        self.max_file_size_input = QSpinBox()
+        self.max_file_size_input.setRange(0, 100000)
+        self.max_file_size_input.setSuffix(" MB")
+        self.max_file_size_input.setSpecialValueText("No limit")
+        source_options.addWidget(self.max_file_size_input)
+        self.source_summary_label = QLabel("")
+        source_options.addWidget(self.source_summary_label)
+        self.rag_layout.addLayout(source_options)
+        self._update_source_summary()
         
+        shard_options = QHBoxLayout()
+        shard_options.addWidget(QLabel("Shards:"))
+        self.shard_count_input = QSpinBox()
+        self.shard_count_input.setRange(1, 64)
+        shard_options.addWidget(self.shard_count_input)
+        self.shard_strategy_input = QComboBox()
+        self.shard_strategy_input.addItem("By file", "file")
+        self.shard_strategy_input.addItem("By hash", "hash")
+        shard_options.addWidget(self.shard_strategy_input)
+        self.rag_layout.addLayout(shard_options)
+
+        reduction_options = QHBoxLayout()
+        self.reduction_method_input = QComboBox()
+        self.reduction_method_input.addItem("Full width", None)
+        self.reduction_method_input.addItem("Truncate", "truncate")
+        self.reduction_method_input.addItem("PCA", "pca")
+        reduction_options.addWidget(self.reduction_method_input)
+        self.reduction_dim_input = QSpinBox()
+        self.reduction_dim_input.setRange(16, 4096)
+        self.reduction_dim_input.setValue(256)
+        self.reduction_dim_input.setSuffix(" dims")
+        reduction_options.addWidget(self.reduction_dim_input)
+        self.rag_layout.addLayout(reduction_options)
+
+        self.high_priority_checkbox = QCheckBox("High priority build")
+        self.rag_layout.addWidget(self.high_priority_checkbox)
+
+        # Writes CPU and allocation profiles of each build and query to profiles/
+        self.profile_checkbox = QCheckBox("Profile builds and queries")
+        self.profile_checkbox.setChecked(profiling_requested())
+        self.rag_layout.addWidget(self.profile_checkbox)
+
         self.create_index_button = QPushButton("Create Index")
         self.create_index_button.clicked.connect(self.create_index)
         self.rag_layout.addWidget(self.create_index_button)
+
+        self.build_job_list = QListWidget()
+        self.build_job_list.setMaximumHeight(80)
+        self.rag_layout.addWidget(self.build_job_list)
+
+        build_controls = QHBoxLayout()
+        self.pause_build_button = QPushButton("Pause/Resume")
+        self.pause_build_button.clicked.connect(self.toggle_pause_build)
+        build_controls.addWidget(self.pause_build_button)
+        self.cancel_build_button = QPushButton("Cancel Build")
+        self.cancel_build_button.clicked.connect(self.cancel_build)
+        build_controls.addWidget(self.cancel_build_button)
+        self.rag_layout.addLayout(build_controls)
         
         self.index_list = QListWidget()
+        self.index_list.setSelectionMode(QAbstractItemView.ExtendedSelection)  # Ctrl/Shift-click to query several indexes
+        self.index_list.itemSelectionChanged.connect(self._warm_selected_indexes)
         self.load_existing_indexes()
         self.rag_layout.addWidget(self.index_list)
         
+        self.import_button = QPushButton("Import Packed Index")
+        self.import_button.clicked.connect(self.import_index)
+        self.rag_layout.addWidget(self.import_button)
+
         self.query_input = QLineEdit()
+        self.query_input.textChanged.connect(self._schedule_speculation)
+        self.speculation_timer = QTimer(self)
+        self.speculation_timer.setSingleShot(True)
+        self.speculation_timer.timeout.connect(self._speculate)
         self.query_input.setPlaceholderText("Enter your query")
         self.rag_layout.addWidget(self.query_input)
         
@@ -317,7 +1077,7 @@ class RAGSidebar(QWidget):
         self.status_label = QLabel("")
         self.rag_layout.addWidget(self.status_label)
 
-        self.docsearch = None
+        self.vector_stores = {}  # Loaded indexes, keyed by index path
 
     def load_existing_indexes(self):
         self.index_list.clear()
@@ -331,6 +1091,8 @@ class RAGSidebar(QWidget):
                 layout.setContentsMargins(5, 0, 5, 0)
 
                 truncated_name = index[:20] + "..." if len(index) > 20 else index
+                if load_build_checkpoint(os.path.join("chroma_indexes", index)) is not None:
+                    truncated_name += " (incomplete)"
                 index_label = QLabel(truncated_name)
                 index_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
 
@@ -363,6 +1125,26 @@ class RAGSidebar(QWidget):
             for file_path in file_paths:
                 self.file_list.addItem(file_path)
 
+    def browse_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Add Folder")
+        if folder:
+            self.add_source_folders([folder])
+
+    def add_source_folders(self, folders):
+        existing = {self.folder_list.item(i).text() for i in range(self.folder_list.count())}
+        for folder in folders:
+            if folder not in existing:
+                self.folder_list.addItem(folder)
+        self._update_source_summary()
+
+    def clear_sources(self):
+        self.file_list.clear()
+        self.folder_list.clear()
+        self._update_source_summary()
+
+    def _update_source_summary(self, *args):
+        self.source_summary_label.setText(f"{self.file_list.count()} files, {self.folder_list.count()} folders")
+
     def create_index(self):
         index_name = self.index_name_input.text().strip()
         if not index_name:
@@ -374,39 +1156,228 @@ class RAGSidebar(QWidget):
 
         index_path = os.path.join("chroma_indexes", index_name)
         if os.path.exists(index_path):
-            QMessageBox.warning(self, "Error", f"Index '{index_name}' already exists.")
+            checkpoint = load_build_checkpoint(index_path)
+            if checkpoint is None:
+                QMessageBox.warning(self, "Error", f"Index '{index_name}' already exists.")
+                return
+            resume = QMessageBox.question(
+                self,
+                "Resume Build",
+                f"Index '{index_name}' has an interrupted build. Resume it, or discard it and delete its files?",
+                QMessageBox.Yes | QMessageBox.Discard | QMessageBox.Cancel,
+                QMessageBox.Yes
+            )
+            if resume == QMessageBox.Yes:
+                self._submit_from_checkpoint(index_name, index_path, checkpoint)
+            elif resume == QMessageBox.Discard:
+                self.discard_build(index_name)
             return
 
         file_paths = [self.file_list.item(i).text() for i in range(self.file_list.count())]
-        if not file_paths:
-            QMessageBox.warning(self, "Error", "Please select at least one file to create the index.")
+        folders = [self.folder_list.item(i).text() for i in range(self.folder_list.count())]
+        if not file_paths and not folders:
+            QMessageBox.warning(self, "Error", "Please select at least one file or folder to create the index.")
             return
+        source = None
+        if folders:
+            # The build walks the folders itself and records the files it finds
+            max_size_mb = self.max_file_size_input.value()
+            source = new_source(file_paths, folders, parse_globs(self.include_globs_input.text()),
+                                parse_globs(self.exclude_globs_input.text()),
+                                max_size_mb * 1024 * 1024 if max_size_mb else None)
+            file_paths = None
 
         os.makedirs(index_path)
+        # Record the build up front so it can be resumed even if it never got to start
+        num_shards = self.shard_count_input.value()
+        shard_strategy = self.shard_strategy_input.currentData()
+        reduction_method = self.reduction_method_input.currentData()
+        reduction = {"method": reduction_method, "dim": self.reduction_dim_input.value()} if reduction_method else None
+        checkpoint = {"file_paths": file_paths, "source": source, "total_chunks": None, "completed": [],
+                      "num_shards": num_shards, "shard_strategy": shard_strategy, "reduction": reduction}
+        save_build_checkpoint(index_path, checkpoint)
+        self._submit_from_checkpoint(index_name, index_path, checkpoint)
+        self.clear_sources()
+        self.index_name_input.clear()
 
-    # Create a worker to handle the long-running task
-        worker = Worker(self._create_index_worker, index_name, index_path, file_paths)
-        worker.signals.finished.connect(lambda: self._on_index_created(index_name))
-        self.threadpool.start(worker)
+    def submit_build(self, index_name, index_path, file_paths, num_shards=1, shard_strategy="file", reduction=None,
+                     source=None):
+        """Queue a build on the scheduler; it resumes from any checkpoint in index_path.
+
+        With ``file_paths`` None the files are discovered from ``source`` (see new_source) by the build.
+        """
+        priority = 1 if self.high_priority_checkbox.isChecked() else 0
+        worker_fn = profiled(self._create_index_worker, "build", index_name, self.profile_checkbox.isChecked())
+        self._queue_build_job(BuildJob(index_name, worker_fn, index_name, index_path, file_paths,
+                                       num_shards, shard_strategy, reduction, source, priority=priority))
+
+    def _submit_from_checkpoint(self, index_name, index_path, checkpoint):
+        self.submit_build(index_name, index_path, checkpoint["file_paths"], checkpoint.get("num_shards", 1),
+                          checkpoint.get("shard_strategy", "file"), checkpoint.get("reduction"),
+                          checkpoint.get("source"))
+
+    def rebuild_shard(self, index_name, name):
+        index_path = os.path.join("chroma_indexes", index_name)
+        self.vector_stores.pop(index_path, None)  # Drop the loaded copy before its files are replaced
+        worker_fn = profiled(self._rebuild_shard_worker, "build", f"{index_name}-{name}", self.profile_checkbox.isChecked())
+        self._queue_build_job(BuildJob(index_name, worker_fn, index_name, index_path, name, priority=1))
+
+    def _queue_build_job(self, job):
+        index_name = job.index_name
+        if any(other.index_name == index_name and other.state in ACTIVE_BUILD_STATES
+               for other in self.build_scheduler.jobs):
+            QMessageBox.warning(self, "Error", f"A build of '{index_name}' is already queued.")
+            return
+        job.signals.result.connect(self._on_index_created)
+        job.signals.error.connect(lambda e, name=index_name: QMessageBox.critical(
+            self, "Error", f"Failed to create index '{name}': {e}\nRe-run Create Index with the same name to resume."))
+        self.build_scheduler.submit(job)
+
+    def resume_interrupted_builds(self):
+        """Offer to resume builds that left a checkpoint behind (e.g. after a crash)."""
+        if not os.path.exists("chroma_indexes"):
+            return
+        interrupted = [name for name in sorted(os.listdir("chroma_indexes"))
+                       if load_build_checkpoint(os.path.join("chroma_indexes", name)) is not None]
+        if not interrupted:
+            return
+        resume = QMessageBox.question(
+            None,
+            "Resume Builds",
+            "The following index builds were interrupted:\n" + "\n".join(f"- {name}" for name in interrupted)
+            + "\n\nResume them now, or discard them and delete their files? "
+            "Single builds can also be resumed or discarded from their info dialog.",
+            QMessageBox.Yes | QMessageBox.Discard | QMessageBox.No,
+            QMessageBox.Yes
+        )
+        if resume == QMessageBox.Yes:
+            for name in interrupted:
+                index_path = os.path.join("chroma_indexes", name)
+                self._submit_from_checkpoint(name, index_path, load_build_checkpoint(index_path))
+        elif resume == QMessageBox.Discard:
+            for name in interrupted:
+                self.discard_build(name, confirm=False)
+
+    def discard_build(self, index_name, confirm=True):
+        """Delete an interrupted or failed build's index directory, so the name can be used afresh."""
+        if any(job.index_name == index_name and job.state in ACTIVE_BUILD_STATES
+               for job in self.build_scheduler.jobs):
+            QMessageBox.warning(self, "Error", f"Cancel the build of '{index_name}' before discarding it.")
+            return
+        if confirm:
+            answer = QMessageBox.question(
+                self,
+                "Discard Build",
+                f"Delete the unfinished index '{index_name}' and everything built so far?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if answer != QMessageBox.Yes:
+                return
+        index_path = os.path.join("chroma_indexes", index_name)
+        self.vector_stores.pop(index_path, None)
+        try:
+            shutil.rmtree(index_path)
+        except OSError as e:
+            # Files this process still holds open (e.g. a cancelled build's Chroma) can only go on the next start
+            print(f"Failed to discard {index_path}: {e}")
+            self.save_delete_index(index_name)
+            QMessageBox.information(self, "Discard Build",
+                                    f"Index '{index_name}' is still in use and will be deleted the next time "
+                                    "the application starts.")
+        self.load_existing_indexes()
+
+    def _selected_build_job(self):
+        item = self.build_job_list.currentItem()
+        if not item:
+            QMessageBox.warning(self, "Error", "Please select a build job.")
+            return None
+        return item.data(Qt.UserRole)
+
+    def toggle_pause_build(self):
+        job = self._selected_build_job()
+        if job is not None:
+            self.build_scheduler.toggle_pause(job)
+
+    def cancel_build(self):
+        job = self._selected_build_job()
+        if job is not None:
+            self.build_scheduler.cancel(job)
+
+    def _update_build_job_item(self, job):
+        item = self.build_job_items.get(job)
+        if item is None:
+            item = QListWidgetItem()
+            item.setData(Qt.UserRole, QVariant(job))
+            self.build_job_list.addItem(item)
+            self.build_job_items[job] = item
+        if job.state in ("running", "pausing", "paused"):
+            item.setText(f"{job.index_name}: {job.state} {job.progress}%" + (f" ({job.status})" if job.status else ""))
+        else:
+            item.setText(f"{job.index_name}: {job.state}")
 
     def _on_index_created(self, index_name):
+        self.builds_completed.append(index_name)
         self.load_existing_indexes()
-        QMessageBox.information(self, "Success", f"Index '{index_name}' created successfully.\n"
+
+    def _on_builds_idle(self):
+        """Restart once every queued build is done, so Chroma picks up the new indexes."""
+        self.load_existing_indexes()
+        if not self.builds_completed:
+            return
+        QMessageBox.information(self, "Success", "Created index(es): " + ", ".join(f"'{name}'" for name in self.builds_completed) + "\n"
     "    * THE APPLICATION WILL RESTART *"
 )
-        self.file_list.clear()
-        self.index_name_input.clear()
         self.restart_app()
 
-    def _create_index_worker(self, index_name, index_path, file_paths):
-        combined_text = process_files(file_paths)
-        create_vector_store(combined_text, index_path, file_paths)
+    def _create_index_worker(self, job, index_name, index_path, file_paths, num_shards=1, shard_strategy="file",
+                             reduction=None, source=None):
+        if num_shards > 1:
+            if file_paths is None:
+                file_paths = []
+                for _ in iter_source_files(source, file_paths, job):
+                    pass  # Files are assigned to shards from the complete list
+                if not file_paths:
+                    raise ValueError("No matching files found in the selected folders.")
+                # Record the list so a resumed build reuses it, in the same order, instead of walking again
+                save_build_checkpoint(index_path, dict(load_build_checkpoint(index_path) or {}, file_paths=file_paths))
+            create_sharded_vector_store(index_path, file_paths, num_shards, shard_strategy, job=job, reduction=reduction)
+            return index_name
+
+        if source is not None:
+            # Files are parsed and embedded while the walk goes on. The files an interrupted
+            # build had found come first, in the same order, so its checkpoint still matches
+            source = dict(source, files=(file_paths or []) + source["files"])
+            file_paths = []
+
+            def chunks():
+                del file_paths[:]
+                found = iter_source_files(source, file_paths, job)
+                first = next(found, None)
+                if first is None:
+                    raise ValueError("No matching files found in the selected folders.")
+                return iter_chunks(itertools.chain([first], found))
+        else:
+            chunks = functools.partial(iter_chunks, file_paths)
+
+        base_embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
+        embeddings = load_reduced_embeddings(index_path, base_embeddings)
+        if reduction is not None and embeddings is base_embeddings:
+            # Fitting the reduction takes a pass over the chunks of its own
+            embeddings = prepare_reduced_embeddings(index_path, reduction["method"], reduction["dim"],
+                                                    with_job_checks((text for text, _ in chunks()), job, index_path),
+                                                    base_embeddings, check=functools.partial(check_job, job, index_path))
+        create_vector_store(chunks, index_path, file_paths, job=job, embeddings=embeddings)
+        return index_name
+
+    def _rebuild_shard_worker(self, job, index_name, index_path, name):
+        rebuild_shard(index_path, name, job=job)
         return index_name
 
 
     def query_index(self):
-        selected_item = self.index_list.currentItem()
-        if not selected_item:
+        selected_items = self.index_list.selectedItems()
+        if not selected_items:
             QMessageBox.warning(self, "Error", "Please select an index to query.")
             return
 
@@ -415,52 +1386,167 @@ class RAGSidebar(QWidget):
             QMessageBox.warning(self, "Error", "Please enter a query.")
             return
 
-        index_name = selected_item.data(Qt.UserRole)
-        index_path = os.path.join("chroma_indexes", index_name)
+        index_names = [item.data(Qt.UserRole) for item in selected_items]
+        index_paths = [os.path.join("chroma_indexes", index_name) for index_name in index_names]
+
+        for index_path in index_paths:
+            if not os.path.exists(index_path):
+                QMessageBox.warning(self, "Error", f"Index path '{index_path}' does not exist.")
+                return
 
-        if not os.path.exists(index_path):
-            QMessageBox.warning(self, "Error", f"Index path '{index_path}' does not exist.")
+        self.status_label.setText("")
+        self._ensure_indexes_loaded(index_paths, lambda: self._start_query(query, index_names))
+
+    def _ensure_indexes_loaded(self, index_paths, on_loaded, show_loading=True):
+        """Open any of the indexes not yet loaded on the thread pool, then call ``on_loaded``.
+
+        Loads already in flight (e.g. warming a just-selected index) are waited
+        on rather than started again. ``show_loading`` disables the query
+        controls and shows a loading message until the indexes are ready.
+        """
+        needed = {index_path for index_path in index_paths if index_path not in self.vector_stores}
+        if not needed:
+            on_loaded()
+            return
+        if show_loading:
+            names = ", ".join(f"'{os.path.basename(index_path)}'" for index_path in sorted(needed))
+            self._set_loading(True, f"Loading index {names}...")
+        self._load_waiters.append((needed, on_loaded, show_loading))
+
+        to_start = sorted(needed - self._loading)
+        if to_start:
+            self._loading.update(to_start)
+            worker = Worker(load_vector_stores, to_start)
+            worker.signals.result.connect(self._on_indexes_loaded)
+            worker.signals.error.connect(lambda e, paths=to_start: self._on_index_load_failed(paths, e))
+            self.threadpool.start(worker)
+
+    def _on_indexes_loaded(self, stores):
+        self.vector_stores.update(stores)
+        self._loading.difference_update(stores)
+        ready = [waiter for waiter in self._load_waiters if waiter[0].issubset(self.vector_stores)]
+        self._load_waiters = [waiter for waiter in self._load_waiters if not waiter[0].issubset(self.vector_stores)]
+        for _, on_loaded, show_loading in ready:
+            if show_loading:
+                self._set_loading(False)
+            on_loaded()
+
+    def _on_index_load_failed(self, index_paths, error):
+        self._loading.difference_update(index_paths)
+        failed = [waiter for waiter in self._load_waiters if waiter[0] & set(index_paths)]
+        self._load_waiters = [waiter for waiter in self._load_waiters if not waiter[0] & set(index_paths)]
+        names = ", ".join(f"'{os.path.basename(index_path)}'" for index_path in index_paths)
+        if any(show_loading for _, _, show_loading in failed):
+            self._set_loading(False, "")
+            QMessageBox.critical(self, "Error", f"Failed to load index {names}: {error}")
+        else:
+            print(f"Failed to warm index {names}: {error}")
+
+    def _selected_index_names(self):
+        return [item.data(Qt.UserRole) for item in self.index_list.selectedItems()]
+
+    def _warm_selected_indexes(self):
+        """Start loading newly selected indexes in the background, before any query."""
+        index_paths = [os.path.join("chroma_indexes", index_name) for index_name in self._selected_index_names()]
+        index_paths = [index_path for index_path in index_paths if os.path.exists(index_path)]
+        if index_paths:
+            self._ensure_indexes_loaded(index_paths, lambda: None, show_loading=False)
+        self._schedule_speculation()
+
+    def _schedule_speculation(self):
+        # Any speculative retrieval still queued is now for stale text
+        self.speculation_generation += 1
+        self.speculation_timer.start(SPECULATION_DEBOUNCE_MS)
+
+    def _speculate(self):
+        """Retrieve for the text typed so far, so a matching real query can reuse it."""
+        query = self.query_input.text().strip()
+        index_names = self._selected_index_names()
+        if not query or not index_names or handle_tasks_match(query):
             return
+        if any(os.path.join("chroma_indexes", index_name) not in self.vector_stores for index_name in index_names):
+            return  # Still warming; the next pause in typing will try again
+        worker = Worker(self._speculative_worker, self.speculation_generation,
+                        self._build_retriever(index_names), build_question(query))
+        self.threadpool.start(worker)
+
+    def _speculative_worker(self, generation, retriever, question):
+        if generation != self.speculation_generation:
+            return None  # The user kept typing; skip the retrieval
+        return retriever.invoke(question)
 
-    # Load the index if it's not already loaded
-        if self.docsearch is None or not self._is_same_index_loaded(index_path):
-            self.docsearch = load_vector_store(index_path)
-            self.current_index_path = index_path  # Store the current index path
+    def _build_retriever(self, index_names):
+        stores = {index_name: self.vector_stores[os.path.join("chroma_indexes", index_name)] for index_name in index_names}
+        if len(stores) == 1:
+            retriever = next(iter(stores.values())).as_retriever(search_kwargs={"k": RETRIEVAL_K})
+        else:
+            # One retrieval per index in parallel, then a single LLM call on the merged context
+            retriever = FederatedRetriever(vector_stores=stores)
+        return PrefetchingRetriever(prefetcher=self.prefetcher, index_key=tuple(index_names), base_retriever=retriever)
+
+    def _set_loading(self, loading, message=None):
+        self.query_button.setEnabled(not loading)
+        self.index_list.setEnabled(not loading)
+        if message is not None:
+            self.status_label.setText(message)
 
+    def _start_query(self, query, index_names):
     # Clear the chatbox before displaying the new query and its result
         self.parent_widget.chatbox.clear()
 
         self.wipe_memory_after_query = True
+        retriever = self._build_retriever(index_names)
+        label = ", ".join(f"'{index_name}'" for index_name in index_names)
+        self.status_label.setText(f"Querying index {label}...")
 
     # Create a worker for the query
-        worker = Worker(self._query_index_worker, query, index_name)
+        worker = Worker(profiled(self._query_index_worker, "query", "+".join(index_names), self.profile_checkbox.isChecked()),
+                        query, retriever)
         worker.signals.result.connect(lambda res: self.parent_widget.chatbox.append(res))
-        worker.signals.finished.connect(lambda: self.status_label.setText(f"Query completed on index '{index_name}'"))
+        worker.signals.finished.connect(lambda: self.status_label.setText(f"Query completed on index {label}"))
         self.threadpool.start(worker)
 
-
-
-    def _is_same_index_loaded(self, index_path):
-        return hasattr(self, 'current_index_path') and self.current_index_path == index_path
-
-    def _query_index_worker(self, query, index_name):
+    def _query_index_worker(self, query, retriever):
         try:
-            chain = create_conversational_chain(self.docsearch)
-            return query_chain(chain, query, self.parent_widget.chatbox)
+            chain = create_conversational_chain(retriever)
+            return query_chain(chain, query)
         except Exception as e:
             print(f"Error in query index worker: {e}")
             return f"Error: {e}"
 
-    def show_index_info(self, index_name):
+    def export_index(self, index_name):
         index_path = os.path.join("chroma_indexes", index_name)
-        file_paths_json = os.path.join(index_path, "file_paths.json")
+        pack_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Packed Index", index_name + PACKED_INDEX_SUFFIX, f"Packed index (*{PACKED_INDEX_SUFFIX})")
+        if not pack_path:
+            return
+        if not pack_path.lower().endswith(PACKED_INDEX_SUFFIX):
+            pack_path += PACKED_INDEX_SUFFIX
+        self.status_label.setText(f"Exporting index '{index_name}'...")
+        worker = Worker(export_packed_index, index_path, pack_path)
+        worker.signals.result.connect(lambda path: self.status_label.setText(f"Exported '{index_name}' to {path}"))
+        worker.signals.error.connect(lambda e: QMessageBox.critical(self, "Error", f"Failed to export index '{index_name}': {e}"))
+        self.threadpool.start(worker)
 
-        if not os.path.exists(file_paths_json):
-            QMessageBox.warning(self, "Error", f"No file information available for index '{index_name}'.")
+    def import_index(self):
+        pack_path, _ = QFileDialog.getOpenFileName(
+            self, "Import Packed Index", "", f"Packed index (*{PACKED_INDEX_SUFFIX})")
+        if not pack_path:
             return
+        self.status_label.setText(f"Importing {os.path.basename(pack_path)}...")
+        worker = Worker(import_packed_index, pack_path)
+        worker.signals.result.connect(self._on_index_imported)
+        worker.signals.error.connect(lambda e: QMessageBox.critical(self, "Error", f"Failed to import index: {e}"))
+        self.threadpool.start(worker)
+
+    def _on_index_imported(self, index_name):
+        self.load_existing_indexes()
+        self.status_label.setText(f"Imported index '{index_name}'")
 
-        with open(file_paths_json, "r") as f:
-            file_paths = json.load(f)
+    def show_index_info(self, index_name):
+        index_path = os.path.join("chroma_indexes", index_name)
+        file_paths = load_index_file_paths(index_path)
+        checkpoint = load_build_checkpoint(index_path) if file_paths is None else None
 
     # Create a dialog for displaying the info
         dialog = QDialog(self)
@@ -472,12 +1558,84 @@ class RAGSidebar(QWidget):
     # Text area to display the list of files
         info_text = QTextEdit()
         info_text.setReadOnly(True)
-        info_text.setText("The following files were used to create this semantic index:\n" + "\n".join([f"- {fp}" for fp in file_paths]))
+        if file_paths is not None:
+            info = "The following files were used to create this semantic index:\n" + "\n".join(
+                [f"- {fp}" for fp in file_paths[:MAX_PRINTED_FILES]])
+            if len(file_paths) > MAX_PRINTED_FILES:
+                info += f"\n... and {len(file_paths) - MAX_PRINTED_FILES} more"
+        elif checkpoint is not None:
+            info = "The build of this index did not finish."
+            # Folder builds only record their files as they find them
+            source = checkpoint.get("source") or {}
+            pending = checkpoint.get("file_paths") or source.get("files", []) + source.get("roots", [])
+            if pending:
+                info += " It was building from:\n" + "\n".join(f"- {fp}" for fp in pending[:MAX_PRINTED_FILES])
+                if len(pending) > MAX_PRINTED_FILES:
+                    info += f"\n... and {len(pending) - MAX_PRINTED_FILES} more"
+        else:
+            info = "No file information available for this index."
+        packed_info = read_packed_info(index_path) if is_packed_index(index_path) else None
+        stats = packed_info.get("dedup_stats") if packed_info is not None else load_dedup_stats(index_path)
+        if stats is not None:
+            info += (f"\n\nChunks embedded: {stats['kept_chunks']} of {stats['total_chunks']} "
+                     f"({stats['exact_duplicates']} exact and {stats['near_duplicates']} near duplicates dropped)")
+            manifest = load_shard_manifest(index_path)
+            if manifest is not None and manifest["strategy"] == "file":
+                info += "; duplicates are only found within each shard"
+        if packed_info is not None:
+            reduction = packed_info.get("dim_reduction")
+            reduction_stats = packed_info.get("dim_reduction_stats")
+        else:
+            reduction = load_reducer_info(index_path)
+            reduction_stats = reduction and reduction["stats"]
+        if reduction is not None:
+            info += f"\n\nVectors reduced to {reduction['dim']} dimensions ({reduction['method']})"
+            if reduction_stats and reduction_stats.get("recall") is not None:
+                info += (f"; recall@{reduction_stats['recall_k']} vs {reduction_stats['full_dim']} dimensions: "
+                         f"{reduction_stats['recall']:.3f} on {reduction_stats['queries']} held-out queries")
+        info_text.setText(info)
         layout.addWidget(info_text)
 
-    # Delete button
-        delete_button = QPushButton("Delete Index")
-        delete_button.clicked.connect(lambda: self.delete_index(index_name))
+        manifest = load_shard_manifest(index_path)
+        if manifest is not None:
+            shard_list = QListWidget()
+            for shard in manifest["shards"]:
+                item = QListWidgetItem(f"{shard['name']}: {shard['status']}, {shard.get('chunks', '?')} chunks, "
+                                       f"{len(shard['file_paths'])} file(s)")
+                item.setData(Qt.UserRole, QVariant(shard["name"]))
+                shard_list.addItem(item)
+            layout.addWidget(QLabel(f"Shards (by {manifest['strategy']}):"))
+            layout.addWidget(shard_list)
+
+            rebuild_button = QPushButton("Rebuild Selected Shard")
+            rebuild_button.clicked.connect(lambda: shard_list.currentItem() and self.rebuild_shard(
+                index_name, shard_list.currentItem().data(Qt.UserRole)))
+            layout.addWidget(rebuild_button)
+
+        if checkpoint is not None:
+            resume_button = QPushButton("Resume Build")
+
+            def resume_build():
+                dialog.accept()
+                self._submit_from_checkpoint(index_name, index_path, load_build_checkpoint(index_path))
+            resume_button.clicked.connect(resume_build)
+            layout.addWidget(resume_button)
+        elif not is_packed_index(index_path):
+            export_button = QPushButton("Export Packed Index...")
+            export_button.clicked.connect(lambda: self.export_index(index_name))
+            layout.addWidget(export_button)
+
+    # Delete button; an unfinished build is not loaded, so it can be deleted without a restart
+        if file_paths is None:
+            delete_button = QPushButton("Discard Build")
+
+            def discard_build():
+                dialog.accept()
+                self.discard_build(index_name)
+            delete_button.clicked.connect(discard_build)
+        else:
+            delete_button = QPushButton("Delete Index")
+            delete_button.clicked.connect(lambda: self.delete_index(index_name))
         layout.addWidget(delete_button)
 
     # Dialog buttons
@@ -518,6 +1676,7 @@ if __name__ == "__main__":
     sidebar = main_window.sidebar
     sidebar.delete_index_after_restart()
     main_window.show()
+    sidebar.resume_interrupted_builds()
     sys.exit(app.exec_())
 
 
@@ -1,12 +1,62 @@
 import sys
+import threading
+import time
+import traceback
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QTextEdit, QHBoxLayout, QVBoxLayout, QWidget, 
     QSizePolicy, QTabWidget, QLabel, QFrame
 )
+from PyQt5.QtCore import QTimer
 
 from RAGsidebar import RAGSidebar  # Ensure this path is correct
 from Instances import ChatWindow  # Import ChatWindow from Instances.py
 
+# GUI-thread blocks longer than this are logged by the stall monitor
+STALL_THRESHOLD_MS = 250
+HEARTBEAT_INTERVAL_MS = 50
+
+class EventLoopStallMonitor:
+    """Log any stretch where the GUI thread stops servicing its event loop.
+
+    A QTimer on the GUI thread records a heartbeat; a watchdog thread checks it
+    and, once the heartbeat is older than the threshold, prints the GUI
+    thread's current stack so the blocking call can be identified.
+    """
+    def __init__(self, threshold_ms=STALL_THRESHOLD_MS):
+        self.threshold = threshold_ms / 1000.0
+        self.gui_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.timer = QTimer()
+        self.timer.timeout.connect(self._beat)
+        self._stop = threading.Event()
+        self._watchdog = threading.Thread(target=self._watch, name="stall-monitor", daemon=True)
+
+    def start(self):
+        self.last_beat = time.monotonic()
+        self.timer.start(HEARTBEAT_INTERVAL_MS)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        self.timer.stop()
+
+    def _beat(self):
+        self.last_beat = time.monotonic()
+
+    def _watch(self):
+        stalled_since = None
+        while not self._stop.wait(self.threshold / 2):
+            last_beat = self.last_beat
+            blocked = time.monotonic() - last_beat
+            if blocked > self.threshold and stalled_since != last_beat:
+                stalled_since = last_beat
+                frame = sys._current_frames().get(self.gui_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else "<unavailable>\n"
+                print(f"GUI thread blocked for {blocked * 1000:.0f}ms, currently in:\n{stack}")
+            elif stalled_since is not None and last_beat != stalled_since:
+                print(f"GUI thread recovered after {(last_beat - stalled_since) * 1000:.0f}ms")
+                stalled_since = None
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -90,9 +140,12 @@ class MainWindow(QMainWindow):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    stall_monitor = EventLoopStallMonitor()
+    stall_monitor.start()
     main_window = MainWindow()
     sidebar = main_window.sidebar
     main_window.reset_state()
     sidebar.delete_index_after_restart()  # Ensure this method is defined in RAGSidebar
     main_window.show()
+    sidebar.resume_interrupted_builds()  # Offer to resume builds interrupted by a crash
     sys.exit(app.exec_())
@@ -0,0 +1,44 @@
+import json
+import os
+
+# Written to the index directory while a build is unfinished; removed once it completes
+BUILD_CHECKPOINT_FILE = "build_checkpoint.json"
+
+def load_build_checkpoint(index_path):
+    """Return the checkpoint of an interrupted build, or None if there is none."""
+    checkpoint_path = os.path.join(index_path, BUILD_CHECKPOINT_FILE)
+    if not os.path.exists(checkpoint_path):
+        return None
+    try:
+        with open(checkpoint_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable build checkpoint in {index_path}: {e}")
+        return None
+
+def save_build_checkpoint(index_path, checkpoint):
+    """Write the checkpoint atomically so a crash never leaves it half-written."""
+    checkpoint_path = os.path.join(index_path, BUILD_CHECKPOINT_FILE)
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def update_fingerprint(digest, text):
+    """Add ``text`` to a running hash of a build's chunks, so a resumed build can tell its sources have not changed."""
+    encoded = text.encode("utf-8")
+    digest.update(len(encoded).to_bytes(8, "little"))
+    digest.update(encoded)
+
+def add_completed_range(ranges, start, end):
+    """Merge the half-open chunk range [start, end) into a sorted list of ranges."""
+    merged = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+def is_chunk_completed(ranges, index):
+    return any(start <= index < end for start, end in ranges)
@@ -0,0 +1,150 @@
+from typing import List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Upper bound on the retrieved context pasted into the prompt
+CONTEXT_TOKEN_BUDGET = 1500
+# Overlaps shorter than this are treated as coincidence, not shared text
+MIN_OVERLAP_CHARS = 20
+# Lines shorter than this (blank lines, short headings) are never dropped as repeats
+MIN_DUPLICATE_LINE_CHARS = 30
+# Metadata naming where a chunk came from, carried over to the block it ends up in
+ORIGIN_KEYS = ("file", "index", "shard")
+
+def estimate_tokens(text):
+    """Rough token count; about four characters per token for English text."""
+    return (len(text) + 3) // 4
+
+def chunk_number(doc):
+    """Return the chunk index of ``doc`` within its index or shard, or None if it is unknown.
+
+    Indexes record it as "chunk" metadata; older ones only encode it in the
+    ``source`` ("12-pl", or "index/12-pl" after a federated merge).
+    """
+    if isinstance(doc.metadata.get("chunk"), int):
+        return doc.metadata["chunk"]
+    source = str(doc.metadata.get("source", "")).rsplit("/", 1)[-1]
+    number = source.split("-", 1)[0]
+    return int(number) if number.isdigit() else None
+
+def overlap_length(left, right):
+    """Length of the longest suffix of ``left`` that is also a prefix of ``right``."""
+    for length in range(min(len(left), len(right)), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+def _can_join(left, right):
+    """Whether ``right`` continues ``left``; returns the overlap length, or None.
+
+    Text from different indexes or files is never joined, however it overlaps.
+    """
+    if right["index"] != left["index"] or right["file"] != left["file"]:
+        return None
+    overlap = overlap_length(left["text"], right["text"])
+    if left["last"] is not None and right["first"] is not None:
+        # Numbered chunks are joined only when they were neighbours in the same shard
+        neighbours = right["first"] == left["last"] + 1 and right["shard"] == left["shard"]
+        return overlap if neighbours else None
+    return overlap or None
+
+def merge_overlapping(docs):
+    """Merge retrieved chunks that are adjacent or share overlapping text.
+
+    Returns ``(text, rank, sources, origin)`` blocks, where ``rank`` is the
+    best (lowest) retrieval rank of the chunks merged into the block and
+    ``origin`` holds the ``ORIGIN_KEYS`` metadata of its first chunk (all of
+    a block's chunks share their index and file).
+    """
+    blocks = []
+    for rank, doc in enumerate(docs):
+        text = doc.page_content
+        if any(text in block["text"] for block in blocks):
+            continue  # Fully contained in a chunk we already have
+        number = chunk_number(doc)
+        blocks.append({"text": text, "rank": rank, "sources": [doc.metadata.get("source")],
+                       "first": number, "last": number, "shard": doc.metadata.get("shard"),
+                       "file": doc.metadata.get("file"), "index": doc.metadata.get("index"),
+                       "origin": {key: doc.metadata[key] for key in ORIGIN_KEYS if key in doc.metadata}})
+
+    merged = True
+    while merged:
+        merged = False
+        for left in blocks:
+            for right in blocks:
+                if left is right:
+                    continue
+                overlap = _can_join(left, right)
+                if overlap is None:
+                    continue
+                separator = "" if overlap else "\n"
+                left["text"] = left["text"] + separator + right["text"][overlap:]
+                left["rank"] = min(left["rank"], right["rank"])
+                left["sources"] += right["sources"]
+                left["last"] = right["last"]
+                blocks.remove(right)
+                merged = True
+                break
+            if merged:
+                break
+    return [(block["text"], block["rank"], block["sources"], block["origin"]) for block in blocks]
+
+def remove_repeated_lines(blocks):
+    """Drop lines that already appeared in a more relevant block."""
+    seen = set()
+    result = []
+    for text, rank, sources, origin in sorted(blocks, key=lambda block: block[1]):
+        kept_lines = []
+        for line in text.split("\n"):
+            key = " ".join(line.split()).lower()
+            if len(key) >= MIN_DUPLICATE_LINE_CHARS:
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept_lines.append(line)
+        text = "\n".join(kept_lines).strip()
+        if text:
+            result.append((text, rank, sources, origin))
+    return result
+
+def compact_documents(docs, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Merge, de-duplicate and trim retrieved ``docs`` to fit ``token_budget``.
+
+    Blocks are kept in relevance order; the block that crosses the budget is
+    truncated and anything after it is dropped. Each block keeps the file,
+    index and shard of its first chunk, so answers can still name their sources.
+    """
+    tokens_before = sum(estimate_tokens(doc.page_content) for doc in docs)
+    blocks = remove_repeated_lines(merge_overlapping(docs))
+
+    compacted = []
+    remaining = token_budget
+    for text, rank, sources, origin in blocks:
+        if remaining <= 0:
+            break
+        tokens = estimate_tokens(text)
+        if tokens > remaining:
+            text = text[:remaining * 4].rsplit(" ", 1)[0] + " ..."
+            tokens = remaining
+        remaining -= tokens
+        compacted.append(Document(page_content=text, metadata=dict(
+            origin,
+            source=sources[0],
+            sources=", ".join(str(source) for source in sources),
+        )))
+
+    tokens_after = sum(estimate_tokens(doc.page_content) for doc in compacted)
+    print(f"Context compaction: {len(docs)} chunks -> {len(compacted)} blocks, "
+          f"~{tokens_before} -> ~{tokens_after} tokens (saved ~{tokens_before - tokens_after})")
+    return compacted
+
+class CompactingRetriever(BaseRetriever):
+    """Wrap a retriever so its results are compacted before reaching the prompt."""
+    base_retriever: BaseRetriever
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs = self.base_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return compact_documents(docs, self.token_budget)
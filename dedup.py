@@ -0,0 +1,138 @@
+import hashlib
+import math
+import re
+import sqlite3
+import zlib
+
+import numpy as np
+
+# MinHash signature length and LSH banding. The signature is cut into 16 bands
+# of 4 rows; two chunks agree on a whole band with probability similarity ** 4,
+# so a chunk is a near duplicate of an earlier one when they share at least
+# LSH_BANDS * NEAR_DUPLICATE_THRESHOLD ** 4 band keys (9 of 16 for 0.85).
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+NEAR_DUPLICATE_THRESHOLD = 0.85
+SHINGLE_WORDS = 5
+
+# Largest prime below 2**32. Shingle hashes and the permutation coefficients are
+# all under 2**32, so a * shingle + b never overflows an unsigned 64-bit integer.
+_PRIME = (1 << 32) - 5
+
+_rng = np.random.RandomState(1)
+_PERMUTATION_A = _rng.randint(1, _PRIME, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERMUTATION_B = _rng.randint(0, _PRIME, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+def normalize_text(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def shingle_hashes(text):
+    """Hash every SHINGLE_WORDS-word window of ``text`` to a 32-bit integer."""
+    words = normalize_text(text).split(" ")
+    if len(words) <= SHINGLE_WORDS:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+            for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def minhash_signature(shingles):
+    """MinHash of a set of 32-bit shingle hashes, all permutations at once, as a uint64 array."""
+    values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    return ((values[:, None] * _PERMUTATION_A + _PERMUTATION_B) % _PRIME).min(axis=0)
+
+def text_digest(text):
+    """Signed 64-bit hash of ``text`` after whitespace and case normalisation."""
+    return int.from_bytes(hashlib.sha1(normalize_text(text).encode("utf-8")).digest()[:8], "little", signed=True)
+
+def band_keys(signature):
+    """One signed 64-bit key per LSH band; two chunks share a key only if they agree on that whole band."""
+    bands = np.ascontiguousarray(signature, dtype=np.uint64).reshape(LSH_BANDS, -1)
+    return [int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8, salt=number.to_bytes(2, "little")).digest(),
+                           "little", signed=True)
+            for number, band in enumerate(bands)]
+
+class ChunkDeduplicator:
+    """Finds exact and near-duplicate chunks as they arrive, one at a time.
+
+    Only what later chunks are compared against is kept: the digest and LSH
+    band keys of every kept chunk, never its text or MinHash signature. They
+    live in an SQLite database at ``path`` (in memory by default), so a build
+    over millions of chunks does not hold them in RAM. Changes are written
+    when ``commit`` is called; a database left by an interrupted build can
+    be reopened and wound back with ``truncate``.
+    """
+    def __init__(self, path=":memory:", threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.min_bands = math.ceil(LSH_BANDS * threshold ** (NUM_PERMUTATIONS // LSH_BANDS))
+        self._db = sqlite3.connect(path)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS kept (chunk INTEGER PRIMARY KEY, digest INTEGER NOT NULL UNIQUE, file TEXT);
+            CREATE TABLE IF NOT EXISTS bands (key INTEGER NOT NULL, chunk INTEGER NOT NULL,
+                                              PRIMARY KEY (key, chunk)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS duplicates (chunk INTEGER PRIMARY KEY, duplicate_of INTEGER NOT NULL,
+                                                   near INTEGER NOT NULL, file TEXT);
+        """)
+
+    def add(self, index, text, file=None):
+        """Record chunk ``index``; returns the kept chunk it duplicates, or None if it is kept itself."""
+        digest = text_digest(text)
+        row = self._db.execute("SELECT chunk FROM kept WHERE digest = ?", (digest,)).fetchone()
+        if row is not None:
+            self._db.execute("INSERT INTO duplicates VALUES (?, ?, 0, ?)", (index, row[0], file))
+            return row[0]
+
+        keys = band_keys(minhash_signature(shingle_hashes(text)))
+        row = self._db.execute(
+            f"SELECT chunk FROM bands WHERE key IN ({', '.join('?' * len(keys))}) GROUP BY chunk "
+            "HAVING COUNT(*) >= ? ORDER BY COUNT(*) DESC, chunk LIMIT 1", keys + [self.min_bands]).fetchone()
+        if row is not None:
+            self._db.execute("INSERT INTO duplicates VALUES (?, ?, 1, ?)", (index, row[0], file))
+            return row[0]
+
+        self._db.execute("INSERT INTO kept VALUES (?, ?, ?)", (index, digest, file))
+        self._db.executemany("INSERT OR IGNORE INTO bands VALUES (?, ?)", [(key, index) for key in keys])
+        return None
+
+    def duplicates(self):
+        """Yield ``(chunk, duplicate_of, file, canonical file)`` for every dropped chunk, in order."""
+        yield from self._db.execute("SELECT d.chunk, d.duplicate_of, d.file, k.file FROM duplicates d "
+                                    "JOIN kept k ON k.chunk = d.duplicate_of ORDER BY d.chunk")
+
+    def stats(self):
+        kept = self._db.execute("SELECT COUNT(*) FROM kept").fetchone()[0]
+        exact, near = self._db.execute("SELECT COUNT(*) - COALESCE(SUM(near), 0), COALESCE(SUM(near), 0) "
+                                       "FROM duplicates").fetchone()
+        return {
+            "total_chunks": kept + exact + near,
+            "kept_chunks": kept,
+            "exact_duplicates": exact,
+            "near_duplicates": near,
+        }
+
+    def truncate(self, count):
+        """Forget every chunk from index ``count`` on, e.g. ones added after the last checkpoint."""
+        for table in ("kept", "bands", "duplicates"):
+            self._db.execute(f"DELETE FROM {table} WHERE chunk >= ?", (count,))
+        self._db.commit()
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+def deduplicate_chunks(texts, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Find exact and near-duplicate chunks in ``texts``.
+
+    Returns ``(duplicate_of, stats)``. ``duplicate_of`` maps the index of every
+    dropped chunk to the index of the earlier chunk it duplicates, which is
+    the one that gets embedded. Exact copies (after whitespace and case
+    normalisation) are caught by hashing; near-duplicates by MinHash with LSH
+    banding, so each chunk is only compared against its band candidates.
+    """
+    deduplicator = ChunkDeduplicator(threshold=threshold)
+    try:
+        for i, text in enumerate(texts):
+            deduplicator.add(i, text)
+        duplicate_of = {chunk: canonical for chunk, canonical, _, _ in deduplicator.duplicates()}
+        return duplicate_of, deduplicator.stats()
+    finally:
+        deduplicator.close()
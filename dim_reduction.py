@@ -0,0 +1,206 @@
+import json
+import os
+import random
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DIM_REDUCTION_FILE = "dim_reduction.json"
+PCA_PROJECTION_FILE = "dim_reduction.npz"
+REDUCTION_METHODS = ("truncate", "pca")
+# Chunks embedded at full width to fit PCA and to measure recall
+FIT_SAMPLE_SIZE = 1000
+# Held-out chunks whose opening text is used as a stand-in query set
+HELD_OUT_QUERIES = 50
+HELD_OUT_QUERY_CHARS = 200
+# Fit chunks embedded per call, with a pause/cancel check in between
+FIT_EMBED_BATCH_SIZE = 64
+RECALL_K = 10
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+class TruncationReducer:
+    """Matryoshka-style reduction: keep the leading dimensions and renormalise."""
+    method = "truncate"
+
+    def __init__(self, dim):
+        self.dim = dim
+
+    def transform(self, vectors):
+        return _normalize(np.asarray(vectors, dtype=np.float32)[:, :self.dim])
+
+    def to_info(self):
+        return {"method": self.method, "dim": self.dim}
+
+class PCAReducer:
+    """Project onto the top principal components of a sample of chunk embeddings."""
+    method = "pca"
+
+    def __init__(self, mean, components):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+        self.dim = len(self.components)
+
+    @classmethod
+    def fit(cls, vectors, dim):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(mean, vt[:dim])
+
+    def transform(self, vectors):
+        return _normalize((np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T)
+
+    def to_info(self):
+        return {"method": self.method, "dim": self.dim}
+
+def reducer_from_info(info, projection=None):
+    """Rebuild a reducer from ``to_info()`` output plus, for PCA, its ``(mean, components)``."""
+    if info is None:
+        return None
+    if info["method"] == "truncate":
+        return TruncationReducer(info["dim"])
+    return PCAReducer(*projection)
+
+def save_reducer(index_path, reducer, stats):
+    info = {"method": reducer.method, "dim": reducer.dim, "stats": stats}
+    if reducer.method == "pca":
+        np.savez(os.path.join(index_path, PCA_PROJECTION_FILE), mean=reducer.mean, components=reducer.components)
+    with open(os.path.join(index_path, DIM_REDUCTION_FILE), "w") as f:
+        json.dump(info, f)
+
+def load_reducer_info(index_path):
+    """Return the saved reduction settings and recall stats of an index, or None."""
+    info_path = os.path.join(index_path, DIM_REDUCTION_FILE)
+    if not os.path.isfile(info_path):
+        return None
+    with open(info_path, "r") as f:
+        return json.load(f)
+
+def load_reducer(index_path):
+    info = load_reducer_info(index_path)
+    if info is None:
+        return None
+    if info["method"] == "truncate":
+        return TruncationReducer(info["dim"])
+    projection = np.load(os.path.join(index_path, PCA_PROJECTION_FILE))
+    return PCAReducer(projection["mean"], projection["components"])
+
+class ReducedEmbeddings(Embeddings):
+    """Embeddings wrapper that projects documents and queries with the index's reducer."""
+    def __init__(self, base, reducer):
+        self.base = base
+        self.reducer = reducer
+        self._full_width = {}
+
+    def seed(self, texts, vectors):
+        """Remember full-width vectors already computed, so those chunks aren't embedded twice."""
+        self._full_width.update(zip(texts, vectors))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # pop() with a default is atomic, so shards built in parallel can share one instance
+        vectors = [self._full_width.pop(text, None) for text in texts]
+        missing = [text for text, vector in zip(texts, vectors) if vector is None]
+        if missing:
+            computed = iter(self.base.embed_documents(missing))
+            vectors = [vector if vector is not None else next(computed) for vector in vectors]
+        return self.reducer.transform(vectors).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.reducer.transform([self.base.embed_query(text)])[0].tolist()
+
+def neighbour_recall(corpus, queries, reducer, k=RECALL_K):
+    """Mean fraction of each query's full-width top-k neighbours still found after reduction."""
+    corpus = np.asarray(corpus, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    k = min(k, len(corpus))
+    if k == 0 or len(queries) == 0:
+        return None
+
+    def top_k(corpus_vectors, query_vectors):
+        # Both sides are unit length, so the nearest neighbours are the largest dot products
+        return np.argpartition(-(query_vectors @ corpus_vectors.T), k - 1, axis=1)[:, :k]
+
+    full = top_k(_normalize(corpus), _normalize(queries))
+    reduced = top_k(reducer.transform(corpus), reducer.transform(queries))
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(full, reduced)]))
+
+def sample_texts(texts, size, seed=0):
+    """Return a uniform random sample of up to ``size`` items of the iterable ``texts``, in one pass."""
+    rng = random.Random(seed)
+    sample = []
+    for i, text in enumerate(texts):
+        if i < size:
+            sample.append(text)
+        else:
+            slot = rng.randrange(i + 1)  # Reservoir sampling: keep item i with probability size / (i + 1)
+            if slot < size:
+                sample[slot] = text
+    rng.shuffle(sample)
+    return sample
+
+def split_held_out(sample):
+    """Split ``sample`` into held-out query texts and fit texts, which never overlap.
+
+    Up to HELD_OUT_QUERIES texts are held out, but no more than a fifth of a
+    small sample, so most of it is still used for the fit.
+    """
+    held = min(HELD_OUT_QUERIES, len(sample) // 5)
+    return sample[:held], sample[held:]
+
+def prepare_reduced_embeddings(index_path, method, dim, texts, base, check=None):
+    """Fit (or reload) the index's reducer and return embeddings that apply it.
+
+    A sample of the chunk texts in the iterable ``texts`` is embedded at full
+    width to fit PCA, and recall@k against full-width search is measured
+    using held-out chunks as queries. ``texts`` is only read if there is no
+    saved reducer. Raises ValueError if ``dim`` is more than the model's
+    width, or, for PCA, more than the number of chunks to fit on. ``check``
+    is called between embedding calls, e.g. to pause or cancel the build. The reducer is saved with the index before any chunk is
+    embedded, so a resumed build reuses the same projection.
+    """
+    reducer = load_reducer(index_path)
+    if reducer is not None:
+        return ReducedEmbeddings(base, reducer)
+    if method not in REDUCTION_METHODS:
+        raise ValueError(f"Unknown dimension reduction method '{method}'")
+    sample = sample_texts(texts, FIT_SAMPLE_SIZE + HELD_OUT_QUERIES)
+    if not sample:
+        return base
+
+    held_out, fit_texts = split_held_out(sample)
+    if method == "pca" and len(fit_texts) < dim:
+        raise ValueError(f"PCA to {dim} dims needs at least {dim} chunks to fit on, but only {len(fit_texts)} "
+                         f"are available; choose fewer dims or the truncate method")
+    fit_vectors = []
+    for start in range(0, len(fit_texts), FIT_EMBED_BATCH_SIZE):
+        if check is not None:
+            check()
+        fit_vectors.extend(base.embed_documents(fit_texts[start:start + FIT_EMBED_BATCH_SIZE]))
+    full_dim = len(fit_vectors[0])
+    if dim > full_dim:
+        raise ValueError(f"Cannot reduce to {dim} dims: the embedding model only produces {full_dim}")
+    reducer = TruncationReducer(dim) if method == "truncate" else PCAReducer.fit(fit_vectors, dim)
+
+    if check is not None:
+        check()
+    query_vectors = [base.embed_query(text[:HELD_OUT_QUERY_CHARS]) for text in held_out]
+    recall = neighbour_recall(fit_vectors, query_vectors, reducer)
+    stats = {"full_dim": full_dim, "recall_k": RECALL_K, "recall": recall,
+             "queries": len(query_vectors), "corpus": len(fit_vectors)}
+    save_reducer(index_path, reducer, stats)
+    print(f"Dimension reduction: {method} {full_dim} -> {dim} dims, "
+          f"recall@{RECALL_K} vs full width: {recall if recall is None else f'{recall:.3f}'} "
+          f"({len(query_vectors)} held-out queries)")
+
+    embeddings = ReducedEmbeddings(base, reducer)
+    embeddings.seed(fit_texts, fit_vectors)
+    return embeddings
+
+def load_reduced_embeddings(index_path, base):
+    """Wrap ``base`` with the index's saved reducer, or return it as-is if there is none."""
+    reducer = load_reducer(index_path)
+    return base if reducer is None else ReducedEmbeddings(base, reducer)
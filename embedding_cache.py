@@ -0,0 +1,34 @@
+import threading
+from collections import OrderedDict
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+QUERY_CACHE_SIZE = 128
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper that remembers recent query vectors.
+
+    Stores that share one instance (e.g. the shards of an index) embed a
+    query once between them instead of once each.
+    """
+    def __init__(self, base, cache_size=QUERY_CACHE_SIZE):
+        self.base = base
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            if text in self._cache:
+                self._cache.move_to_end(text)
+                return self._cache[text]
+        vector = self.base.embed_query(text)
+        with self._lock:
+            self._cache[text] = vector
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return vector
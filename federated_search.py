@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Results fetched from each index, and kept after merging across indexes
+PER_INDEX_K = 4
+FEDERATED_K = 6
+# Rank offset of reciprocal rank fusion; larger values flatten the gap between ranks
+RRF_K = 60
+
+def search_indexes(vector_stores, query, per_index_k=PER_INDEX_K):
+    """Search every store in ``vector_stores`` ({index name: store}) concurrently.
+
+    Returns ``(index name, document, relevance)`` for all hits. Relevance is
+    each store's own score and is only comparable within one index: vectors
+    are not unit length at full width but are after dimension reduction, so
+    distances from different indexes are on different scales.
+    """
+    def search(item):
+        index_name, store = item
+        return [(index_name, doc, score)
+                for doc, score in store.similarity_search_with_relevance_scores(query, k=per_index_k)]
+
+    with ThreadPoolExecutor(max_workers=max(1, len(vector_stores))) as executor:
+        per_index = list(executor.map(search, vector_stores.items()))
+    return [hit for hits in per_index for hit in hits]
+
+def fuse_scores(hits, rrf_k=RRF_K):
+    """Score hits from different indexes on one scale with reciprocal rank fusion.
+
+    Each hit scores ``1 / (rrf_k + rank)`` by its rank within its own index,
+    so only the order each index gives its hits matters, never the raw score.
+    Hits of equal rank are ordered by their score min-max normalised within
+    their index. Returns ``(index name, document, fused score, tiebreak)``.
+    """
+    by_index = {}
+    for index_name, doc, score in hits:
+        by_index.setdefault(index_name, []).append((doc, score))
+    fused = []
+    for index_name, index_hits in by_index.items():
+        index_hits.sort(key=lambda hit: hit[1], reverse=True)
+        high, low = index_hits[0][1], index_hits[-1][1]
+        for rank, (doc, score) in enumerate(index_hits, 1):
+            tiebreak = (score - low) / (high - low) if high > low else 1.0
+            fused.append((index_name, doc, 1.0 / (rrf_k + rank), tiebreak))
+    return fused
+
+def merge_hits(hits, k=FEDERATED_K):
+    """Keep the ``k`` best hits across all indexes by fused rank, tagging each with its index.
+
+    The index name goes in "index" metadata, which keeps compaction from
+    joining chunks of different indexes, and is prefixed to the source for
+    display. The chunk number stays in its own "chunk" key.
+    """
+    merged = []
+    fused = sorted(fuse_scores(hits), key=lambda hit: (hit[2], hit[3]), reverse=True)
+    for index_name, doc, score, _ in fused[:k]:
+        metadata = dict(doc.metadata)
+        metadata["index"] = index_name
+        metadata["source"] = f"{index_name}/{metadata.get('source', '')}"
+        metadata["relevance"] = round(score, 4)
+        merged.append(Document(page_content=doc.page_content, metadata=metadata))
+    return merged
+
+class FederatedRetriever(BaseRetriever):
+    """Retrieve from several indexes in parallel and merge their top results by rank."""
+    vector_stores: Dict[str, object]
+    per_index_k: int = PER_INDEX_K
+    k: int = FEDERATED_K
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        hits = search_indexes(self.vector_stores, query, self.per_index_k)
+        print(f"Federated search: {len(hits)} hits from {len(self.vector_stores)} indexes, keeping top {self.k}")
+        return merge_hits(hits, self.k)
@@ -0,0 +1,123 @@
+import fnmatch
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# File types process_files knows how to chunk
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".csv", ".json", ".jsonl", ".ndjson")
+# Directories listed at the same time while walking a tree
+DISCOVERY_WORKERS = 16
+# Minimum gap between progress callbacks, in seconds
+PROGRESS_INTERVAL = 0.25
+
+def new_source(files=(), roots=(), include=(), exclude=(), max_size=None):
+    """Describe the files to index: explicit ``files`` plus everything found under ``roots``.
+
+    ``include`` and ``exclude`` are glob patterns matched against both the
+    path relative to its root (with ``/`` separators) and the bare name, so
+    ``*.pdf``, ``reports/*`` and ``node_modules`` all work. Excluded
+    directories are not descended into. ``max_size`` is in bytes.
+    """
+    return {
+        "files": list(files),
+        "roots": list(roots),
+        "include": list(include),
+        "exclude": list(exclude),
+        "extensions": list(SUPPORTED_EXTENSIONS),
+        "max_size": max_size,
+    }
+
+def parse_globs(text):
+    """Split a ``;`` or ``,`` separated list of glob patterns."""
+    return [pattern.strip() for pattern in text.replace(",", ";").split(";") if pattern.strip()]
+
+def _matches(rel_path, name, patterns):
+    return any(fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+def _scan_directory(root, directory, source):
+    """List one directory; returns ``(subdirectories, accepted files)``."""
+    include, exclude = source.get("include") or [], source.get("exclude") or []
+    extensions = tuple(source.get("extensions") or SUPPORTED_EXTENSIONS)
+    max_size = source.get("max_size")
+    subdirs, files = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                rel_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not _matches(rel_path, entry.name, exclude):
+                            subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file() or not entry.name.lower().endswith(extensions):
+                        continue
+                    if include and not _matches(rel_path, entry.name, include):
+                        continue
+                    if _matches(rel_path, entry.name, exclude):
+                        continue
+                    if max_size and entry.stat().st_size > max_size:
+                        continue
+                except OSError:
+                    continue  # Vanished or unreadable entry
+                files.append(entry.path)
+    except OSError as e:
+        print(f"Skipping unreadable directory {directory}: {e}")
+    return subdirs, sorted(files)
+
+def discover_files(source, job=None, on_progress=None, workers=DISCOVERY_WORKERS):
+    """Yield every file described by ``source`` (see new_source), as it is found.
+
+    Explicit files come first, then the roots are walked with ``workers``
+    directories listed concurrently, so slow network shares are not walked
+    one round trip at a time. Each path is yielded once even if roots
+    overlap. ``job`` is polled for pause and cancel between directories;
+    on cancel the walk stops early. ``on_progress(files_found, dirs_scanned)``
+    is called at most every ``PROGRESS_INTERVAL`` seconds and once at the end.
+    """
+    seen = set()
+    found = 0
+    scanned = 0
+    last_report = 0.0
+
+    def report(force=False):
+        nonlocal last_report
+        if on_progress is not None and (force or time.monotonic() - last_report >= PROGRESS_INTERVAL):
+            last_report = time.monotonic()
+            on_progress(found, scanned)
+
+    def new_path(path):
+        key = os.path.normcase(os.path.abspath(path))
+        if key in seen:
+            return False
+        seen.add(key)
+        return True
+
+    for file_path in source.get("files") or []:
+        if new_path(file_path):
+            found += 1
+            yield file_path
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_scan_directory, root, root, source): root
+                   for root in source.get("roots") or [] if new_path(root)}
+        while pending:
+            if job is not None:
+                job.wait_if_paused()
+                if job.is_cancelled():
+                    for future in pending:
+                        future.cancel()
+                    return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                root = pending.pop(future)
+                subdirs, files = future.result()
+                scanned += 1
+                for subdir in subdirs:
+                    if new_path(subdir):
+                        pending[executor.submit(_scan_directory, root, subdir, source)] = root
+                for file_path in files:
+                    if new_path(file_path):
+                        found += 1
+                        yield file_path
+            report()
+    report(force=True)
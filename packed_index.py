@@ -0,0 +1,216 @@
+import json
+import math
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from array import array
+from typing import List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Single-file index layout (all integers little-endian):
+#
+#   header       HEADER_FORMAT, padded to HEADER_SIZE bytes
+#   vectors      float32[count][dim], starting on a BLOCK_ALIGNMENT boundary
+#   norms        float32[count], squared L2 norm of every vector
+#   text index   uint64[count + 1], offsets of each chunk into the text block
+#   text         UTF-8 chunk text, back to back
+#   meta index   uint64[count + 1], offsets of each chunk into the meta block
+#   meta         UTF-8 JSON metadata of each chunk, back to back
+#   info         UTF-8 JSON describing the whole index (small: names, stats, settings)
+#   files        UTF-8 source file paths, NUL-separated
+#   projection   float32[full_dim] mean, then float32[dim][full_dim] PCA components
+#                (only for PCA-reduced indexes; full_dim is 0 otherwise)
+#
+# Every block is addressed by offset from the header, so opening a pack maps
+# the file and reads the header and the small info block; chunk text and
+# metadata are decoded only for search hits, and the file list only on request.
+PACKED_INDEX_SUFFIX = ".ragpack"
+PACKED_INDEX_MAGIC = b"RAGPACK\0"
+PACKED_INDEX_VERSION = 1
+HEADER_FORMAT = "<8sIIQQQQQQQQQQQQQ"
+HEADER_SIZE = 128
+BLOCK_ALIGNMENT = 64
+EXPORT_BATCH_SIZE = 1000
+
+def is_packed_index(path):
+    return os.path.isfile(path) and path.lower().endswith(PACKED_INDEX_SUFFIX)
+
+def _align(f):
+    padding = -f.tell() % BLOCK_ALIGNMENT
+    f.write(b"\0" * padding)
+    return f.tell()
+
+def _write_blobs(f, blobs_file, offsets):
+    index_offset = _align(f)
+    f.write(offsets.tobytes())
+    data_offset = _align(f)
+    blobs_file.seek(0)
+    shutil.copyfileobj(blobs_file, f)
+    return index_offset, data_offset
+
+def iter_chroma_records(store, batch_size=EXPORT_BATCH_SIZE):
+    """Yield ``(embedding, text, metadata)`` for every chunk in a Chroma store, in batches."""
+    offset = 0
+    while True:
+        batch = store.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            return
+        for embedding, text, metadata in zip(batch["embeddings"], batch["documents"], batch["metadatas"]):
+            yield embedding, text, metadata or {}
+        offset += len(batch["ids"])
+
+def write_packed_index(pack_path, records, info, file_paths=(), projection=None):
+    """Write ``records`` (``(embedding, text, metadata)`` tuples) to a packed index file.
+
+    Vectors are streamed straight into place; chunk text and metadata are
+    spooled to temporary files so memory use stays flat for large indexes.
+    ``projection`` is the ``(mean, components)`` of a PCA-reduced index.
+    """
+    dim = None
+    count = 0
+    norms = array("f")
+    text_offsets = array("Q", [0])
+    meta_offsets = array("Q", [0])
+    tmp_path = pack_path + ".tmp"
+    with open(tmp_path, "wb") as f, tempfile.TemporaryFile() as texts, tempfile.TemporaryFile() as metas:
+        f.write(b"\0" * HEADER_SIZE)
+        vectors_offset = _align(f)
+        for embedding, text, metadata in records:
+            vector = array("f", embedding)
+            if dim is None:
+                dim = len(vector)
+            elif len(vector) != dim:
+                raise ValueError(f"Chunk {count} has {len(vector)} dimensions, expected {dim}")
+            f.write(vector.tobytes())
+            norms.append(sum(x * x for x in vector))
+            text_offsets.append(text_offsets[-1] + texts.write(text.encode("utf-8")))
+            meta_offsets.append(meta_offsets[-1] + metas.write(json.dumps(metadata).encode("utf-8")))
+            count += 1
+
+        norms_offset = _align(f)
+        f.write(norms.tobytes())
+        text_index_offset, text_offset = _write_blobs(f, texts, text_offsets)
+        meta_index_offset, meta_offset = _write_blobs(f, metas, meta_offsets)
+        info_offset = f.tell()
+        info_bytes = json.dumps(info).encode("utf-8")
+        f.write(info_bytes)
+        files_offset = f.tell()
+        files_bytes = "\0".join(file_paths).encode("utf-8")
+        f.write(files_bytes)
+
+        projection_offset = full_dim = 0
+        if projection is not None:
+            mean, components = (np.asarray(block, dtype="<f4") for block in projection)
+            full_dim = len(mean)
+            projection_offset = _align(f)
+            f.write(mean.tobytes())
+            f.write(components.tobytes())
+
+        f.seek(0)
+        f.write(struct.pack(HEADER_FORMAT, PACKED_INDEX_MAGIC, PACKED_INDEX_VERSION, dim or 0, count,
+                            vectors_offset, norms_offset, text_index_offset, text_offset,
+                            meta_index_offset, meta_offset, info_offset, len(info_bytes),
+                            files_offset, len(files_bytes), projection_offset, full_dim))
+    os.replace(tmp_path, pack_path)
+    return count
+
+def read_packed_header(mapped):
+    magic, version = struct.unpack_from("<8sI", mapped, 0)
+    if magic != PACKED_INDEX_MAGIC:
+        raise ValueError("Not a packed index file")
+    if version != PACKED_INDEX_VERSION:
+        raise ValueError(f"Unsupported packed index version {version}")
+    keys = ("dim", "count", "vectors", "norms", "text_index", "text", "meta_index", "meta", "info", "info_length",
+            "files", "files_length", "projection", "full_dim")
+    return dict(zip(keys, struct.unpack_from(HEADER_FORMAT, mapped, 0)[2:]))
+
+def _read_block(f, offset, length):
+    f.seek(offset)
+    return f.read(length).decode("utf-8")
+
+def read_packed_info(pack_path):
+    """Return the index-level info of a pack without mapping its data blocks."""
+    with open(pack_path, "rb") as f:
+        header = read_packed_header(f.read(HEADER_SIZE))
+        return json.loads(_read_block(f, header["info"], header["info_length"]))
+
+def read_packed_file_paths(pack_path):
+    """Return the source files recorded in a pack, reading only the header and file block."""
+    with open(pack_path, "rb") as f:
+        header = read_packed_header(f.read(HEADER_SIZE))
+        files = _read_block(f, header["files"], header["files_length"])
+        return files.split("\0") if files else []
+
+class PackedVectorStore:
+    """Memory-mapped, read-only view of a packed index file.
+
+    Search is a brute-force squared-L2 scan over the mapped vectors, the same
+    distance Chroma uses by default, with relevance scores mapped to [0, 1]
+    the same way, so hits can be merged with those from Chroma indexes.
+    """
+    def __init__(self, pack_path, embeddings=None):
+        self.pack_path = pack_path
+        self.embeddings = embeddings  # May be set after opening, once ``info`` has been read
+        with open(pack_path, "rb") as f:
+            self._mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = read_packed_header(self._mapped)
+        count, dim = header["count"], header["dim"]
+        self.count = count
+        self._vectors = np.frombuffer(self._mapped, dtype="<f4", count=count * dim,
+                                      offset=header["vectors"]).reshape(count, dim)
+        self._norms = np.frombuffer(self._mapped, dtype="<f4", count=count, offset=header["norms"])
+        self._text_index = np.frombuffer(self._mapped, dtype="<u8", count=count + 1, offset=header["text_index"])
+        self._meta_index = np.frombuffer(self._mapped, dtype="<u8", count=count + 1, offset=header["meta_index"])
+        self._text_offset = header["text"]
+        self._meta_offset = header["meta"]
+        info_start = header["info"]
+        self.info = json.loads(self._mapped[info_start:info_start + header["info_length"]].decode("utf-8"))
+        self.projection = None  # (mean, components) of a PCA-reduced index, mapped in place
+        if header["full_dim"]:
+            full_dim = header["full_dim"]
+            mean = np.frombuffer(self._mapped, dtype="<f4", count=full_dim, offset=header["projection"])
+            components = np.frombuffer(self._mapped, dtype="<f4", count=dim * full_dim,
+                                       offset=header["projection"] + 4 * full_dim).reshape(dim, full_dim)
+            self.projection = (mean, components)
+        self._header = header
+
+    def _blob(self, base, index, i):
+        return self._mapped[base + int(index[i]):base + int(index[i + 1])].decode("utf-8")
+
+    def file_paths(self):
+        header = self._header
+        files = self._mapped[header["files"]:header["files"] + header["files_length"]].decode("utf-8")
+        return files.split("\0") if files else []
+
+    def document(self, i):
+        return Document(page_content=self._blob(self._text_offset, self._text_index, i),
+                        metadata=json.loads(self._blob(self._meta_offset, self._meta_index, i)))
+
+    def similarity_search_with_relevance_scores(self, query, k=4, **kwargs):
+        k = min(k, self.count)
+        if k == 0:
+            return []
+        q = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        distances = self._norms - 2.0 * (self._vectors @ q) + float(q @ q)
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [(self.document(int(i)), 1.0 - float(distances[i]) / math.sqrt(2)) for i in top]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_relevance_scores(query, k=k, **kwargs)]
+
+    def as_retriever(self, **kwargs):
+        return PackedRetriever(store=self, k=kwargs.get("search_kwargs", {}).get("k", 4))
+
+class PackedRetriever(BaseRetriever):
+    store: object
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.store.similarity_search(query, k=self.k)
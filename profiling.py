@@ -0,0 +1,214 @@
+import collections
+import contextlib
+import functools
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+
+# Set to 1 to profile index builds and queries (ticks the UI checkbox at startup), or to
+# "cpu" to skip allocation tracing, which can slow allocation-heavy code down several times
+PROFILE_ENV_VAR = "RAG_PROFILE"
+PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL_MS = 10
+SAMPLER_THREAD_NAME = "profile-sampler"
+TRACEMALLOC_FRAMES = 1
+# Entries listed in each section of summary.txt
+SUMMARY_TOP = 20
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False  # Whether tracing was started here rather than by the user (e.g. -X tracemalloc)
+_tracemalloc_sessions = 0  # Profiled operations that have started tracing so far
+_profile_sequence = itertools.count(1)
+
+def profiling_requested():
+    return os.environ.get(PROFILE_ENV_VAR, "").strip().lower() not in ("", "0", "false", "no")
+
+def memory_tracing_requested():
+    return os.environ.get(PROFILE_ENV_VAR, "").strip().lower() != "cpu"
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Wall-clock sampling profiler for one operation.
+
+    Every ``interval_ms`` it records the stacks of the thread that started it
+    and of every thread created since (e.g. shard builders and federated
+    search workers), so time spent waiting on HTTP or locks shows up as well
+    as CPU time. Threads that already existed, such as the GUI thread and
+    idle pool threads, are left out.
+    """
+    def __init__(self, interval_ms=SAMPLE_INTERVAL_MS):
+        self.interval = interval_ms / 1000.0
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._owner = threading.get_ident()
+        self._existing = {thread.ident for thread in threading.enumerate()} - {self._owner}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=SAMPLER_THREAD_NAME, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or ident in self._existing or names.get(ident) == SAMPLER_THREAD_NAME:
+                    continue  # Skip old threads and the samplers of other profiled operations
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.stacks[(names.get(ident, str(ident)),) + tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Stacks in collapsed "thread;outer;...;inner count" form, as read by flame graph tools."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def hotspots(self, top=SUMMARY_TOP):
+        """Return ``(self, inclusive)`` sample counts per function, largest first.
+
+        Counts are per sampled thread, so with several threads at work they
+        add up to more than ``samples``.
+        """
+        own, inclusive = collections.Counter(), collections.Counter()
+        for stack, count in self.stacks.items():
+            frames = stack[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for name in set(frames):
+                inclusive[name] += count
+        return own.most_common(top), inclusive.most_common(top)
+
+def _start_tracemalloc():
+    """Start tracing for one operation; returns its start snapshot and a token for _stop_tracemalloc.
+
+    The peak is process-wide, so it is only reset when no other profiled
+    operation is tracing; otherwise resetting it would corrupt theirs.
+    """
+    global _tracemalloc_users, _tracemalloc_started, _tracemalloc_sessions
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _tracemalloc_started = True
+        if _tracemalloc_users == 0:
+            tracemalloc.reset_peak()
+        _tracemalloc_users += 1
+        _tracemalloc_sessions += 1
+        token = (_tracemalloc_users > 1, _tracemalloc_sessions)
+    return tracemalloc.take_snapshot(), token
+
+def _stop_tracemalloc(token):
+    """Returns the end snapshot, the peak, and whether other operations traced at the same time."""
+    global _tracemalloc_users, _tracemalloc_started
+    # Leave out what the profiler itself allocated
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, __file__),
+                                                          tracemalloc.Filter(False, tracemalloc.__file__)])
+    peak = tracemalloc.get_traced_memory()[1]
+    with _tracemalloc_lock:
+        overlapped_at_start, session = token
+        overlapped = overlapped_at_start or _tracemalloc_sessions != session
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_started:
+            tracemalloc.stop()
+            _tracemalloc_started = False
+    return snapshot, peak, overlapped
+
+def _write_summary(path, operation, label, elapsed, outcome, sampler, growth, peak, overlapped):
+    own, inclusive = sampler.hotspots()
+    total = max(sum(sampler.stacks.values()), 1)
+    if peak is None:
+        peak_text = "not traced"
+    else:
+        peak_text = f"{peak / (1024 * 1024):.1f} MB"
+        if overlapped:
+            peak_text += " (process-wide; other profiled operations ran at the same time)"
+    lines = [f"{operation} '{label}': {outcome} in {elapsed:.2f}s, "
+             f"{sampler.samples} samples every {sampler.interval * 1000:.0f}ms",
+             f"Peak traced memory: {peak_text}", "",
+             "Top functions by own time (% of thread samples):"]
+    lines += [f"  {count * 100 / total:6.1f}%  {name}" for name, count in own]
+    lines += ["", "Top functions by inclusive time (% of thread samples):"]
+    lines += [f"  {count * 100 / total:6.1f}%  {name}" for name, count in inclusive]
+    if growth is not None:
+        lines += ["", "Largest allocators still holding memory at the end (growth since start):"]
+        lines += [f"  {stat.size_diff / 1024:10.1f} KiB  {stat.count_diff:+8d} blocks  {stat.traceback[0]}"
+                  for stat in growth[:SUMMARY_TOP]]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return lines
+
+@contextlib.contextmanager
+def profile_operation(operation, label, trace_memory=True):
+    """Sample stacks and trace allocations while the block runs, then write the artifacts.
+
+    They go to ``PROFILE_DIR/<timestamp>-<sequence>-<operation>-<label>/``: ``stacks.txt``
+    (collapsed stacks), ``summary.txt`` with the top hotspots and allocators,
+    and with ``trace_memory`` also ``memory.snapshot`` (tracemalloc.Snapshot.load)
+    and ``allocations.txt``. Artifacts are written even if the block raises.
+    """
+    safe_label = re.sub(r"[^\w.-]+", "_", str(label))[:60]
+    now = time.time()
+    timestamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}"
+    out_dir = os.path.join(PROFILE_DIR, f"{timestamp}-{next(_profile_sequence)}-{operation}-{safe_label}")
+    start_snapshot, token = _start_tracemalloc() if trace_memory else (None, None)
+    sampler = StackSampler()
+    sampler.start()
+    start = time.perf_counter()
+    outcome = "finished"
+    try:
+        yield
+    except BaseException as e:
+        outcome = f"raised {type(e).__name__}"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+        end_snapshot, peak, overlapped = _stop_tracemalloc(token) if trace_memory else (None, None, False)
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            with open(os.path.join(out_dir, "stacks.txt"), "w", encoding="utf-8") as f:
+                f.write(sampler.collapsed())
+            growth = None
+            if end_snapshot is not None:
+                end_snapshot.dump(os.path.join(out_dir, "memory.snapshot"))
+                with open(os.path.join(out_dir, "allocations.txt"), "w", encoding="utf-8") as f:
+                    f.write("".join(f"{stat}\n" for stat in end_snapshot.statistics("lineno")[:100]))
+                growth = end_snapshot.compare_to(start_snapshot, "lineno")
+            summary = _write_summary(os.path.join(out_dir, "summary.txt"), operation, label, elapsed, outcome,
+                                     sampler, growth, peak, overlapped)
+            print(f"Profile written to {out_dir}")
+            print("\n".join(summary[:4 + min(5, SUMMARY_TOP)]))
+        except OSError as e:
+            print(f"Failed to write profile to {out_dir}: {e}")
+
+def profiled(fn, operation, label, enabled=None):
+    """Return ``fn`` wrapped in profile_operation if ``enabled``, otherwise ``fn`` itself.
+
+    ``enabled`` defaults to whether the ``RAG_PROFILE`` environment variable
+    is set; allocations are traced unless it is set to "cpu".
+    """
+    if enabled is None:
+        enabled = profiling_requested()
+    if not enabled:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with profile_operation(operation, label, trace_memory=memory_tracing_requested()):
+            return fn(*args, **kwargs)
+    return wrapper
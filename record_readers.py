@@ -0,0 +1,163 @@
+import csv
+import io
+import json
+
+READ_BLOCK_SIZE = 1 << 16
+# Most of a chunk a repeated header may take; longer headers are truncated
+MAX_HEADER_FRACTION = 0.5
+_JSON_WHITESPACE = " \t\r\n"
+# Characters that may follow a complete element of a JSON array
+_JSON_ARRAY_DELIMITERS = _JSON_WHITESPACE + ",]"
+
+def _format_csv_row(row):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(row)
+    return buffer.getvalue()
+
+def pack_records(records, chunk_size, header="", split_oversized=None):
+    """Pack whole records into chunks of at most ``chunk_size`` characters.
+
+    ``header`` is repeated at the top of every chunk, truncated to at most
+    ``MAX_HEADER_FRACTION`` of it, so a very wide header never leaves rows
+    without room. A record that cannot fit in a chunk on its own is passed to
+    ``split_oversized(record, max_size)``, which returns a list of pieces,
+    and each piece becomes its own chunk.
+    """
+    prefix = header + "\n" if header else ""
+    max_prefix = int(chunk_size * MAX_HEADER_FRACTION)
+    if len(prefix) > max_prefix:
+        prefix = header[:max_prefix - 4] + "...\n" if max_prefix > 4 else ""
+    budget = chunk_size - len(prefix)
+    current = []
+    current_len = 0
+    for record in records:
+        if len(record) > budget:
+            if current:
+                yield prefix + "\n".join(current)
+                current, current_len = [], 0
+            pieces = split_oversized(record, budget) if split_oversized else [record]
+            for piece in pieces:
+                yield prefix + piece
+            continue
+        added = len(record) + (1 if current else 0)
+        if current and current_len + added > budget:
+            yield prefix + "\n".join(current)
+            current, current_len = [], 0
+            added = len(record)
+        current.append(record)
+        current_len += added
+    if current:
+        yield prefix + "\n".join(current)
+
+def iter_csv_chunks(file_path, chunk_size, split_oversized=None):
+    """Stream a CSV file as chunks of whole rows, each starting with the header row."""
+    with open(file_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        rows = (_format_csv_row(row) for row in reader if any(field.strip() for field in row))
+        yield from pack_records(rows, chunk_size, header=_format_csv_row(header), split_oversized=split_oversized)
+
+def iter_jsonl_records(file_path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping invalid JSON on line {line_number} of {file_path}: {e}")
+
+def _check_json_array_end(f, rest):
+    """Raise, as json.load does, if anything but whitespace follows the closing bracket."""
+    while True:
+        if rest.strip(_JSON_WHITESPACE):
+            raise ValueError("Extra data after the top-level JSON array")
+        rest = f.read(READ_BLOCK_SIZE)
+        if not rest:
+            return
+
+def iter_json_array(f, first_char):
+    """Incrementally decode the elements of a top-level JSON array from ``f``.
+
+    Only one element (plus one read block) is held in memory at a time. The
+    syntax is as strict as json.load: elements are separated by exactly one
+    comma, and only whitespace may follow the closing bracket. Errors are
+    raised as ValueError when they are reached, after the elements before
+    them have been yielded.
+    """
+    decoder = json.JSONDecoder()
+    buffer = first_char
+    pos = 1  # Skip the opening bracket
+    eof = False
+    expected = "element or ]"  # Then "element" after a comma, and ", or ]" after an element
+    while True:
+        while True:
+            while pos < len(buffer) and buffer[pos] in _JSON_WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            block = f.read(READ_BLOCK_SIZE)
+            eof = not block
+            buffer, pos = buffer[pos:] + block, 0
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        char = buffer[pos]
+        if char == "]" and expected != "element":
+            _check_json_array_end(f, buffer[pos + 1:])
+            return
+        if expected == ", or ]" and char == ",":
+            expected = "element"
+            pos += 1
+            continue
+        if expected == ", or ]" or char in ",]":
+            raise ValueError(f"Expecting {expected} in JSON array, found {char!r}")
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+            # A number cut at a block boundary (e.g. "123|.45" or "12|e5") decodes as a
+            # shorter number, so only trust a value that is followed by a delimiter
+            complete = eof or (end < len(buffer) and buffer[end] in _JSON_ARRAY_DELIMITERS)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if complete:
+            yield value
+            buffer, pos = buffer[end:], 0
+            expected = ", or ]"
+            continue
+        block = f.read(READ_BLOCK_SIZE)
+        eof = not block
+        buffer, pos = buffer[pos:] + block, 0
+
+def iter_json_records(file_path):
+    """Yield the records of a JSON or JSON Lines file.
+
+    Top-level arrays are parsed incrementally, one element at a time. Any other
+    top-level value is loaded whole; an object yields one record per key.
+    """
+    if file_path.lower().endswith((".jsonl", ".ndjson")):
+        yield from iter_jsonl_records(file_path)
+        return
+    with open(file_path, "r", encoding="utf-8") as f:
+        first_char = ""
+        while True:
+            first_char = f.read(1)
+            if not first_char or not first_char.isspace():
+                break
+        if first_char == "[":
+            yield from iter_json_array(f, first_char)
+            return
+        data = json.loads(first_char + f.read())
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield {key: value}
+    else:
+        yield data
+
+def iter_json_chunks(file_path, chunk_size, split_oversized=None):
+    """Stream a JSON/JSONL file as chunks of whole, compactly serialised records."""
+    records = (json.dumps(record, ensure_ascii=False) for record in iter_json_records(file_path))
+    yield from pack_records(records, chunk_size, split_oversized=split_oversized)
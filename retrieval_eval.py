@@ -0,0 +1,155 @@
+import argparse
+import functools
+import json
+import os
+import re
+import shutil
+import statistics
+import tempfile
+import time
+
+from langchain_community.embeddings import OllamaEmbeddings
+from langchain_community.vectorstores import Chroma
+
+from file_discovery import discover_files, new_source
+from RAGsidebar import (
+    CHUNK_OVERLAP, CHUNK_SIZE, EMBEDDING_MODEL, RETRIEVAL_K, create_vector_store, iter_chunks
+)
+
+def _normalize_text(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def load_questions(path):
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            question = json.loads(line)
+            if not question.get("answers") and not question.get("files"):
+                raise ValueError(f"{path}:{line_number}: question has neither 'answers' nor 'files'")
+            questions.append(question)
+    return questions
+
+def evidence_found(question, text, file_path):
+    """Return the labelled evidence items of ``question`` that a retrieved chunk covers.
+
+    A chunk covers an answer string it contains (ignoring case and whitespace)
+    and a labelled file whose name its source path ends with.
+    """
+    normalized = _normalize_text(text)
+    found = {("answer", answer) for answer in question.get("answers", []) if _normalize_text(answer) in normalized}
+    path = file_path.replace("\\", "/")
+    found |= {("file", name) for name in question.get("files", []) if path.endswith(name.replace("\\", "/"))}
+    return found
+
+def score_hits(question, hits):
+    """Recall (fraction of evidence items covered) and reciprocal rank of the first relevant hit."""
+    wanted = len(question.get("answers", [])) + len(question.get("files", []))
+    covered = set()
+    reciprocal_rank = 0.0
+    for rank, (text, file_path) in enumerate(hits, 1):
+        found = evidence_found(question, text, file_path)
+        if found and not reciprocal_rank:
+            reciprocal_rank = 1.0 / rank
+        covered |= found
+    return len(covered) / wanted, reciprocal_rank
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def evaluate_config(file_paths, questions, chunk_size, chunk_overlap, ks, work_dir):
+    """Build one index variant and score it at every k; returns one result row per k."""
+    index_path = os.path.join(work_dir, f"chunk{chunk_size}-overlap{chunk_overlap}")
+    os.makedirs(index_path)
+    start = time.perf_counter()
+    embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL)
+    stats = create_vector_store(functools.partial(iter_chunks, file_paths, chunk_size, chunk_overlap), index_path,
+                                file_paths, embeddings=embeddings)
+    build_seconds = time.perf_counter() - start
+    size_bytes = directory_size(index_path)
+
+    store = Chroma(persist_directory=index_path, embedding_function=embeddings)
+    rows = []
+    for k in ks:
+        recalls, reciprocal_ranks, latencies = [], [], []
+        for question in questions:
+            search_start = time.perf_counter()
+            docs = store.similarity_search(question["question"], k=k)
+            latencies.append(time.perf_counter() - search_start)
+            hits = [(doc.page_content, doc.metadata["file"]) for doc in docs]
+            recall, reciprocal_rank = score_hits(question, hits)
+            recalls.append(recall)
+            reciprocal_ranks.append(reciprocal_rank)
+        rows.append({
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "k": k,
+            "recall": statistics.mean(recalls),
+            "mrr": statistics.mean(reciprocal_ranks),
+            "chunks": stats["total_chunks"],
+            "build_seconds": build_seconds,
+            "index_bytes": size_bytes,
+            "latency_ms_mean": statistics.mean(latencies) * 1000,
+            "latency_ms_p95": sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)] * 1000,
+        })
+    return rows
+
+def format_table(rows):
+    columns = [
+        ("chunk", "chunk_size", "{}"), ("overlap", "chunk_overlap", "{}"), ("k", "k", "{}"),
+        ("recall@k", "recall", "{:.3f}"), ("MRR", "mrr", "{:.3f}"), ("chunks", "chunks", "{}"),
+        ("build s", "build_seconds", "{:.1f}"), ("size MB", "index_bytes", "{:.1f}"),
+        ("lat ms", "latency_ms_mean", "{:.1f}"), ("p95 ms", "latency_ms_p95", "{:.1f}"),
+    ]
+    cells = [[title for title, _, _ in columns]]
+    for row in rows:
+        cells.append([fmt.format(row[key] / (1024 * 1024) if key == "index_bytes" else row[key])
+                      for _, key, fmt in columns])
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    lines = ["  ".join(cell.rjust(width) for cell, width in zip(line, widths)) for line in cells]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+def _int_list(text):
+    return [int(value) for value in text.split(",") if value.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep chunking and retrieval k against a labelled question set.")
+    parser.add_argument("--questions", required=True, help="JSONL file of labelled questions")
+    parser.add_argument("--files", nargs="*", default=[], help="Corpus files")
+    parser.add_argument("--folder", action="append", default=[], help="Corpus folder, walked like in the app")
+    parser.add_argument("--chunk-sizes", type=_int_list, default=[CHUNK_SIZE])
+    parser.add_argument("--overlaps", type=_int_list, default=[CHUNK_OVERLAP])
+    parser.add_argument("--k", type=_int_list, default=[RETRIEVAL_K])
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    parser.add_argument("--keep-indexes", help="Build the variants here and keep them, instead of a temp dir")
+    args = parser.parse_args(argv)
+
+    questions = load_questions(args.questions)
+    file_paths = list(discover_files(new_source(args.files, args.folder)))
+    if not file_paths:
+        parser.error("no corpus files given or found")
+    configs = [(size, overlap) for size in args.chunk_sizes for overlap in args.overlaps if overlap < size]
+    print(f"Evaluating {len(configs)} chunkings x {len(args.k)} k values on {len(file_paths)} files, "
+          f"{len(questions)} questions")
+
+    work_dir = args.keep_indexes or tempfile.mkdtemp(prefix="rag-eval-")
+    os.makedirs(work_dir, exist_ok=True)
+    rows = []
+    try:
+        for chunk_size, chunk_overlap in configs:
+            print(f"Building chunk_size={chunk_size} chunk_overlap={chunk_overlap}")
+            rows.extend(evaluate_config(file_paths, questions, chunk_size, chunk_overlap, sorted(args.k), work_dir))
+    finally:
+        if not args.keep_indexes:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(format_table(rows))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"files": len(file_paths), "questions": len(questions), "results": rows}, f, indent=2)
+    return rows
+
+if __name__ == "__main__":
+    main()
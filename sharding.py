@@ -0,0 +1,186 @@
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+SHARD_MANIFEST_FILE = "shard_manifest.json"
+SHARD_MANIFEST_VERSION = 1
+SHARDS_DIR = "shards"
+SHARD_STRATEGIES = ("file", "hash")
+SHARD_SPOOL_SUFFIX = ".chunks.jsonl"
+
+def shard_name(shard_index):
+    return f"shard-{shard_index:03d}"
+
+def shard_path(index_path, name):
+    return os.path.join(index_path, SHARDS_DIR, name)
+
+def shard_spool_path(index_path, name):
+    """Where the chunks of one shard of a hash-sharded index wait to be embedded."""
+    return os.path.join(index_path, SHARDS_DIR, name + SHARD_SPOOL_SUFFIX)
+
+def assign_files_to_shards(file_paths, num_shards):
+    """Spread whole files over ``num_shards`` shards, balancing total bytes.
+
+    Largest files are placed first, each on the currently smallest shard.
+    """
+    def size(file_path):
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return 0
+
+    loads = [(0, shard_index) for shard_index in range(num_shards)]
+    assignment = [[] for _ in range(num_shards)]
+    for file_path in sorted(file_paths, key=size, reverse=True):
+        load, shard_index = heapq.heappop(loads)
+        assignment[shard_index].append(file_path)
+        heapq.heappush(loads, (load + size(file_path), shard_index))
+    return assignment
+
+def shard_for_chunk(chunk, num_shards):
+    """Stable hash assignment, so exact duplicate chunks always land in the same shard."""
+    return zlib.crc32(chunk.encode("utf-8")) % num_shards
+
+def spool_shard_chunks(chunks, spool_paths, num_shards):
+    """Write ``(text, source file)`` chunks to the spool file of the shard their hash picks.
+
+    ``spool_paths`` maps shard index to spool path; chunks of shards missing
+    from it are skipped. One JSON line is written per chunk, in order.
+    """
+    with contextlib.ExitStack() as stack:
+        files = {}
+        for shard_index, path in spool_paths.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            files[shard_index] = stack.enter_context(open(path, "w", encoding="utf-8"))
+        for text, chunk_file in chunks:
+            f = files.get(shard_for_chunk(text, num_shards))
+            if f is not None:
+                f.write(json.dumps([text, chunk_file]) + "\n")
+
+def iter_spooled_chunks(path):
+    """Yield the ``(text, source file)`` chunks written to a spool file by spool_shard_chunks."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            text, chunk_file = json.loads(line)
+            yield text, chunk_file
+
+def new_manifest(file_paths, num_shards, strategy):
+    if strategy not in SHARD_STRATEGIES:
+        raise ValueError(f"Unknown shard strategy '{strategy}'")
+    file_assignment = assign_files_to_shards(file_paths, num_shards) if strategy == "file" else None
+    shards = []
+    for shard_index in range(num_shards):
+        shards.append({
+            "name": shard_name(shard_index),
+            "file_paths": file_assignment[shard_index] if file_assignment else file_paths,
+            "status": "pending",
+        })
+    return {
+        "version": SHARD_MANIFEST_VERSION,
+        "strategy": strategy,
+        "num_shards": num_shards,
+        "file_paths": file_paths,
+        "shards": shards,
+    }
+
+def load_shard_manifest(index_path):
+    manifest_path = os.path.join(index_path, SHARD_MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SHARD_MANIFEST_VERSION:
+        raise ValueError(f"Unsupported shard manifest version {manifest.get('version')} in {index_path}")
+    return manifest
+
+def save_shard_manifest(index_path, manifest):
+    manifest_path = os.path.join(index_path, SHARD_MANIFEST_FILE)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+class ShardJob:
+    """Per-shard view of a BuildJob for shards built in parallel.
+
+    Pause and cancel requests go straight to the parent job; the shards'
+    progress is averaged into one overall percentage for it.
+    """
+    def __init__(self, job, progress, shard_index, lock):
+        self.job = job
+        self.progress = progress
+        self.shard_index = shard_index
+        self.lock = lock
+
+    def wait_if_paused(self):
+        if self.job is not None:
+            self.job.wait_if_paused()
+
+    def is_cancelled(self):
+        return self.job is not None and self.job.is_cancelled()
+
+    def working(self):
+        """Count the calling shard thread as working on the parent job (see BuildJob.working)."""
+        return self.job.working() if self.job is not None else contextlib.nullcontext()
+
+    def report_progress(self, percent):
+        with self.lock:
+            self.progress[self.shard_index] = percent
+            overall = sum(self.progress) // len(self.progress)
+        if self.job is not None:
+            self.job.report_progress(overall)
+
+def shard_jobs(job, num_shards):
+    progress = [0] * num_shards
+    lock = threading.Lock()
+    return [ShardJob(job, progress, shard_index, lock) for shard_index in range(num_shards)]
+
+class ShardedVectorStore:
+    """Read-side view of a sharded index that searches all shards concurrently.
+
+    Each shard's hits come back sorted by relevance and are combined with a
+    k-way merge. The shards share one embeddings object whose query cache is
+    warmed first, so a query is embedded once rather than once per shard.
+    """
+    def __init__(self, shards, embeddings):
+        self.shards = shards  # {shard name: Chroma}
+        self.embeddings = embeddings
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(shards)))
+
+    def similarity_search_with_relevance_scores(self, query, k=4, **kwargs):
+        self.embeddings.embed_query(query)
+
+        def search(item):
+            name, store = item
+            hits = []
+            for doc, score in store.similarity_search_with_relevance_scores(query, k=k, **kwargs):
+                metadata = dict(doc.metadata)
+                metadata["shard"] = name
+                hits.append((Document(page_content=doc.page_content, metadata=metadata), score))
+            return sorted(hits, key=lambda hit: hit[1], reverse=True)
+
+        per_shard = list(self._executor.map(search, self.shards.items()))
+        return list(itertools.islice(heapq.merge(*per_shard, key=lambda hit: -hit[1]), k))
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_relevance_scores(query, k=k, **kwargs)]
+
+    def as_retriever(self, **kwargs):
+        return ShardedRetriever(store=self, k=kwargs.get("search_kwargs", {}).get("k", 4))
+
+class ShardedRetriever(BaseRetriever):
+    store: object
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.store.similarity_search(query, k=self.k)
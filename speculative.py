@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Pause in typing before speculative retrieval starts
+SPECULATION_DEBOUNCE_MS = 400
+# Speculative results kept around for reuse
+PREFETCH_CACHE_SIZE = 16
+
+class RetrievalPrefetcher:
+    """Share retrieval results between speculative and real queries.
+
+    Results are stored as futures keyed by (indexes, question), so a real
+    query that matches a speculative one either reuses its finished result
+    or waits for the retrieval already in flight instead of starting another.
+    """
+    def __init__(self, max_entries=PREFETCH_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fetch(self, key, compute):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._futures[key] = future
+                while len(self._futures) > self.max_entries:
+                    self._futures.popitem(last=False)
+            else:
+                self._futures.move_to_end(key)
+        if owner:
+            try:
+                future.set_result(compute())
+            except Exception as e:
+                with self._lock:
+                    self._futures.pop(key, None)  # Let the next caller retry
+                future.set_exception(e)
+        return future.result()
+
+    def clear(self):
+        with self._lock:
+            self._futures.clear()
+
+class PrefetchingRetriever(BaseRetriever):
+    """Retriever that goes through a RetrievalPrefetcher, keyed by the indexes it searches."""
+    prefetcher: object
+    index_key: tuple
+    base_retriever: BaseRetriever
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.prefetcher.fetch(self.index_key + (query,), lambda: self.base_retriever.invoke(query))
@@ -0,0 +1,57 @@
+import hashlib
+
+from build_checkpoint import (
+    BUILD_CHECKPOINT_FILE, add_completed_range, is_chunk_completed, load_build_checkpoint, save_build_checkpoint,
+    update_fingerprint
+)
+
+def test_ranges_merge_when_they_touch_or_overlap():
+    ranges = add_completed_range([], 0, 32)
+    ranges = add_completed_range(ranges, 32, 64)
+    assert ranges == [[0, 64]]
+    ranges = add_completed_range(ranges, 96, 128)
+    assert ranges == [[0, 64], [96, 128]]
+    ranges = add_completed_range(ranges, 50, 100)
+    assert ranges == [[0, 128]]
+
+def test_ranges_stay_sorted_whatever_order_they_arrive_in():
+    ranges = []
+    for start in (64, 0, 128):
+        ranges = add_completed_range(ranges, start, start + 32)
+    assert ranges == [[0, 32], [64, 96], [128, 160]]
+    assert add_completed_range(ranges, 32, 64) == [[0, 96], [128, 160]]
+
+def test_add_completed_range_leaves_its_input_alone():
+    ranges = [[0, 10]]
+    add_completed_range(ranges, 20, 30)
+    assert ranges == [[0, 10]]
+
+def test_chunk_completed_uses_half_open_ranges():
+    ranges = [[0, 32], [64, 96]]
+    assert is_chunk_completed(ranges, 0)
+    assert is_chunk_completed(ranges, 31)
+    assert not is_chunk_completed(ranges, 32)
+    assert is_chunk_completed(ranges, 64)
+    assert not is_chunk_completed(ranges, 96)
+    assert not is_chunk_completed([], 0)
+
+def test_checkpoint_round_trip(tmp_path):
+    assert load_build_checkpoint(str(tmp_path)) is None
+    checkpoint = {"file_paths": ["a.txt"], "completed": [[0, 32]], "chunks_read": 32}
+    save_build_checkpoint(str(tmp_path), checkpoint)
+    assert load_build_checkpoint(str(tmp_path)) == checkpoint
+    assert [path.name for path in tmp_path.iterdir()] == [BUILD_CHECKPOINT_FILE]
+
+def test_unreadable_checkpoint_is_ignored(tmp_path):
+    (tmp_path / BUILD_CHECKPOINT_FILE).write_text('{"completed": [[0, 3', encoding="utf-8")
+    assert load_build_checkpoint(str(tmp_path)) is None
+
+def test_fingerprint_separates_chunk_boundaries():
+    def fingerprint(chunks):
+        digest = hashlib.sha1()
+        for chunk in chunks:
+            update_fingerprint(digest, chunk)
+        return digest.hexdigest()
+
+    assert fingerprint(["ab", "c"]) != fingerprint(["a", "bc"])
+    assert fingerprint(["ab", "c"]) == fingerprint(["ab", "c"])
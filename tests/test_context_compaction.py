@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+
+from context_compaction import chunk_number, compact_documents, estimate_tokens, merge_overlapping
+from federated_search import merge_hits
+
+SHARED = "the quarterly revenue grew by twelve percent "
+
+def _doc(text, **metadata):
+    return Document(page_content=text, metadata=metadata)
+
+def test_federated_hits_from_different_indexes_are_not_joined():
+    hits = [("idxA", _doc("First report. " + SHARED, source="3-pl", chunk=3, file="a.txt"), 0.9),
+            ("idxB", _doc(SHARED + "Second report.", source="4-pl", chunk=4, file="a.txt"), 0.8)]
+    blocks = merge_overlapping(merge_hits(hits))
+    assert len(blocks) == 2
+    assert {origin["index"] for _, _, _, origin in blocks} == {"idxA", "idxB"}
+
+def test_unnumbered_chunks_from_different_files_are_not_joined():
+    docs = [_doc("First report. " + SHARED, file="a.txt"), _doc(SHARED + "Second report.", file="b.txt")]
+    assert len(merge_overlapping(docs)) == 2
+
+def test_overlapping_chunks_of_one_file_are_joined():
+    docs = [_doc("First report. " + SHARED, file="a.txt"), _doc(SHARED + "Second report.", file="a.txt")]
+    (text, rank, sources, origin), = merge_overlapping(docs)
+    assert text == "First report. " + SHARED + "Second report."
+    assert origin == {"file": "a.txt"}
+
+def test_chunk_number_survives_federated_merge():
+    merged, = merge_hits([("idxA", _doc("text", source="12-pl", chunk=12), 0.5)])
+    assert merged.metadata["source"] == "idxA/12-pl"
+    assert chunk_number(merged) == 12
+    assert chunk_number(_doc("text", source="idxA/7-pl")) == 7
+
+def _words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+def test_blocks_follow_relevance_order():
+    docs = [_doc(_words("fifth", 10), source="5-pl", chunk=5, file="a.txt"),
+            _doc(_words("other", 10), source="9-pl", chunk=9, file="b.txt"),
+            _doc(_words("fourth", 10), source="4-pl", chunk=4, file="a.txt")]
+    first, second = compact_documents(docs)
+    # The fourth chunk only ranked third, but joins the best hit, so the block takes its rank
+    assert first.page_content == _words("fourth", 10) + "\n" + _words("fifth", 10)
+    assert first.metadata["sources"] == "4-pl, 5-pl"
+    assert second.page_content == _words("other", 10)
+
+def test_budget_truncates_the_crossing_block_and_drops_the_rest():
+    docs = [_doc(_words("alpha", 20), file="a.txt"), _doc(_words("beta", 40), file="b.txt"),
+            _doc(_words("gamma", 20), file="c.txt")]
+    budget = estimate_tokens(docs[0].page_content) + 20
+    first, second = compact_documents(docs, token_budget=budget)
+    assert first.page_content == docs[0].page_content
+    assert second.page_content.endswith(" ...")
+    assert docs[1].page_content.startswith(second.page_content[:-len(" ...")])
+    assert estimate_tokens(second.page_content[:-len(" ...")]) <= 20
+    assert second.metadata["file"] == "b.txt"
+
+def test_lines_repeated_in_a_less_relevant_block_are_dropped():
+    shared = "this line is long enough to count as a repeat"
+    docs = [_doc("top hit\n" + shared, file="a.txt"), _doc(shared + "\nsecond hit", file="b.txt")]
+    first, second = compact_documents(docs)
+    assert shared in first.page_content
+    assert second.page_content == "second hit"
@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from dedup import ChunkDeduplicator, deduplicate_chunks
+
+def _paragraph(seed, words=120):
+    rng = random.Random(seed)
+    return " ".join(f"word{rng.randrange(5000)}" for _ in range(words))
+
+def test_exact_duplicates_ignore_case_and_whitespace():
+    texts = [_paragraph(1), _paragraph(2), "  " + _paragraph(1).upper().replace(" ", "\n  "), _paragraph(2)]
+    duplicate_of, stats = deduplicate_chunks(texts)
+    assert duplicate_of == {2: 0, 3: 1}
+    assert stats == {"total_chunks": 4, "kept_chunks": 2, "exact_duplicates": 2, "near_duplicates": 0}
+
+def test_near_duplicates_are_dropped_but_different_texts_kept():
+    original = _paragraph(3).split(" ")
+    edited = original[:60] + ["changed"] + original[61:]
+    texts = [_paragraph(4), " ".join(original), _paragraph(5), " ".join(edited)]
+    duplicate_of, stats = deduplicate_chunks(texts)
+    assert duplicate_of == {3: 1}
+    assert stats["near_duplicates"] == 1 and stats["exact_duplicates"] == 0
+
+def test_canonical_chunk_is_earlier_and_kept():
+    texts = []
+    for i in range(40):
+        texts.append(_paragraph(i % 15))
+        if i % 4 == 0:
+            words = _paragraph(i % 15).split(" ")
+            texts.append(" ".join(words[:-1] + ["tail"]))
+    duplicate_of, stats = deduplicate_chunks(texts)
+    assert stats["kept_chunks"] == 15
+    assert stats["total_chunks"] == len(texts)
+    for dropped, canonical in duplicate_of.items():
+        assert canonical < dropped
+        assert canonical not in duplicate_of
+
+def test_truncate_forgets_later_chunks(tmp_path):
+    deduplicator = ChunkDeduplicator(str(tmp_path / "state.sqlite"))
+    deduplicator.add(0, _paragraph(6))
+    deduplicator.add(1, _paragraph(7))
+    deduplicator.add(2, _paragraph(6))
+    deduplicator.truncate(1)
+    assert deduplicator.add(1, _paragraph(7)) is None
+    assert deduplicator.stats()["total_chunks"] == 2
+    deduplicator.close()
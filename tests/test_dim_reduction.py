@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from dim_reduction import DIM_REDUCTION_FILE, HELD_OUT_QUERIES, prepare_reduced_embeddings, split_held_out
+
+class FakeEmbeddings:
+    def __init__(self, width=8):
+        self.width = width
+        self.embedded = []
+
+    def _vector(self, text):
+        return [float((hash(text) >> shift) % 7) for shift in range(self.width)]
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+def test_held_out_queries_never_overlap_the_fit_set():
+    for size in (1, 4, 20, 60, 300):
+        sample = [f"chunk {i}" for i in range(size)]
+        held_out, fit = split_held_out(sample)
+        assert not set(held_out) & set(fit)
+        assert sorted(held_out + fit) == sorted(sample)
+        assert len(held_out) <= min(HELD_OUT_QUERIES, size // 5)
+        assert fit
+
+def test_pca_with_too_few_chunks_raises(tmp_path):
+    base = FakeEmbeddings()
+    with pytest.raises(ValueError, match="needs at least 6 chunks"):
+        prepare_reduced_embeddings(str(tmp_path), "pca", 6, [f"chunk {i}" for i in range(5)], base)
+    assert not base.embedded
+    assert not (tmp_path / DIM_REDUCTION_FILE).exists()
+
+def test_more_dims_than_the_model_raises(tmp_path):
+    with pytest.raises(ValueError, match="only produces 8"):
+        prepare_reduced_embeddings(str(tmp_path), "truncate", 16, ["a", "b"], FakeEmbeddings())
+
+def test_pca_keeps_requested_dims(tmp_path):
+    embeddings = prepare_reduced_embeddings(str(tmp_path), "pca", 4, [f"chunk {i}" for i in range(30)],
+                                            FakeEmbeddings())
+    assert embeddings.reducer.dim == 4
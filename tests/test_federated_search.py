@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+
+from federated_search import RRF_K, fuse_scores, merge_hits, search_indexes
+
+def _hit(index_name, name, score, **metadata):
+    return index_name, Document(page_content=name, metadata=dict(metadata, source=f"{name}-pl")), score
+
+class FakeStore:
+    def __init__(self, *scored):
+        self.scored = scored
+
+    def similarity_search_with_relevance_scores(self, query, k=4):
+        return [(Document(page_content=text), score) for text, score in self.scored[:k]]
+
+def test_fused_score_depends_only_on_rank_within_each_index():
+    hits = [_hit("a", "a2", 0.98), _hit("a", "a1", 0.99), _hit("b", "b1", 0.20), _hit("b", "b2", 0.10)]
+    fused = {doc.page_content: (score, tiebreak) for _, doc, score, tiebreak in fuse_scores(hits)}
+    assert fused["a1"][0] == fused["b1"][0] == 1.0 / (RRF_K + 1)
+    assert fused["a2"][0] == fused["b2"][0] == 1.0 / (RRF_K + 2)
+    assert fused["a1"][1] == fused["b1"][1] == 1.0
+    assert fused["a2"][1] == fused["b2"][1] == 0.0
+
+def test_tiebreak_is_normalised_within_each_index():
+    hits = [_hit("a", "a1", 0.9), _hit("a", "a2", 0.7), _hit("a", "a3", 0.5), _hit("b", "b1", 3.0)]
+    fused = {doc.page_content: tiebreak for _, doc, _, tiebreak in fuse_scores(hits)}
+    assert fused == pytest.approx({"a1": 1.0, "a2": 0.5, "a3": 0.0, "b1": 1.0})
+
+def test_merge_interleaves_indexes_whatever_their_score_scales():
+    hits = [_hit("a", "a1", 0.99), _hit("a", "a2", 0.98), _hit("a", "a3", 0.97),
+            _hit("b", "b1", 0.20), _hit("b", "b2", 0.10)]
+    merged = merge_hits(hits, k=4)
+    assert [doc.page_content for doc in merged] == ["a1", "b1", "a2", "b2"]
+
+def test_merge_tags_hits_with_their_index():
+    original = Document(page_content="text", metadata={"source": "12-pl", "chunk": 12, "file": "a.txt"})
+    merged, = merge_hits([("idxA", original, 0.5)])
+    assert merged.metadata == {"source": "idxA/12-pl", "chunk": 12, "file": "a.txt", "index": "idxA",
+                               "relevance": round(1.0 / (RRF_K + 1), 4)}
+    assert original.metadata == {"source": "12-pl", "chunk": 12, "file": "a.txt"}
+
+def test_search_indexes_collects_hits_from_every_store():
+    stores = {"a": FakeStore(("a1", 0.9), ("a2", 0.8), ("a3", 0.7)), "b": FakeStore(("b1", 0.5))}
+    hits = search_indexes(stores, "query", per_index_k=2)
+    assert sorted((name, doc.page_content, score) for name, doc, score in hits) == [
+        ("a", "a1", 0.9), ("a", "a2", 0.8), ("b", "b1", 0.5)]
@@ -0,0 +1,98 @@
+import struct
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from packed_index import (
+    BLOCK_ALIGNMENT, HEADER_FORMAT, HEADER_SIZE, PACKED_INDEX_MAGIC, PACKED_INDEX_VERSION, PackedVectorStore,
+    read_packed_file_paths, read_packed_header, read_packed_info, write_packed_index
+)
+
+RECORDS = [
+    ([1.0, 0.0, 0.0], "first chunk", {"source": "0-pl", "file": "a.txt"}),
+    ([0.0, 2.0, 0.0], "zweiter Abschnitt äöü", {"source": "1-pl", "file": "b.pdf"}),
+    ([0.0, 0.0, 3.0], "", {}),
+]
+FILES = ["/data/a.txt", "/data/b.pdf"]
+
+def _write(tmp_path, **kwargs):
+    pack_path = str(tmp_path / "index.ragpack")
+    info = {"name": "index", "dedup_stats": None}
+    assert write_packed_index(pack_path, iter(RECORDS), info, **kwargs) == len(RECORDS)
+    with open(pack_path, "rb") as f:
+        data = f.read()
+    return pack_path, data, read_packed_header(data)
+
+def test_header_and_block_layout(tmp_path):
+    _, data, header = _write(tmp_path, file_paths=FILES)
+
+    assert struct.calcsize(HEADER_FORMAT) <= HEADER_SIZE
+    assert data[:8] == PACKED_INDEX_MAGIC
+    assert struct.unpack_from("<I", data, 8)[0] == PACKED_INDEX_VERSION
+    assert (header["dim"], header["count"]) == (3, 3)
+    for block in ("vectors", "norms", "text_index", "text", "meta_index", "meta"):
+        assert header[block] % BLOCK_ALIGNMENT == 0, block
+    assert header["vectors"] >= HEADER_SIZE
+    assert header["norms"] >= header["vectors"] + 4 * 3 * 3
+    assert header["projection"] == header["full_dim"] == 0
+
+    vectors = np.frombuffer(data, dtype="<f4", count=9, offset=header["vectors"]).reshape(3, 3)
+    assert vectors.tolist() == [vector for vector, _, _ in RECORDS]
+    norms = np.frombuffer(data, dtype="<f4", count=3, offset=header["norms"])
+    assert norms.tolist() == [1.0, 4.0, 9.0]
+
+def test_text_and_metadata_offset_tables(tmp_path):
+    _, data, header = _write(tmp_path)
+
+    text_index = np.frombuffer(data, dtype="<u8", count=4, offset=header["text_index"]).tolist()
+    texts = [data[header["text"] + start:header["text"] + end].decode("utf-8")
+             for start, end in zip(text_index, text_index[1:])]
+    assert texts == [text for _, text, _ in RECORDS]
+    meta_index = np.frombuffer(data, dtype="<u8", count=4, offset=header["meta_index"]).tolist()
+    assert meta_index[0] == 0 and meta_index == sorted(meta_index)
+    assert header["meta"] + meta_index[-1] <= header["info"]
+
+def test_round_trip_through_store(tmp_path):
+    pack_path, _, _ = _write(tmp_path, file_paths=FILES)
+
+    store = PackedVectorStore(pack_path)
+    assert [store.document(i).page_content for i in range(3)] == [text for _, text, _ in RECORDS]
+    assert [store.document(i).metadata for i in range(3)] == [metadata for _, _, metadata in RECORDS]
+    assert store.info == read_packed_info(pack_path) == {"name": "index", "dedup_stats": None}
+    assert store.projection is None
+
+def test_files_block(tmp_path):
+    pack_path, data, header = _write(tmp_path, file_paths=FILES)
+
+    block = data[header["files"]:header["files"] + header["files_length"]]
+    assert block.split(b"\0") == [path.encode("utf-8") for path in FILES]
+    assert read_packed_file_paths(pack_path) == FILES
+    assert PackedVectorStore(pack_path).file_paths() == FILES
+    assert "file_paths" not in read_packed_info(pack_path)
+
+def test_empty_files_block(tmp_path):
+    pack_path, _, header = _write(tmp_path)
+    assert header["files_length"] == 0
+    assert read_packed_file_paths(pack_path) == []
+
+def test_projection_block(tmp_path):
+    mean = np.arange(5, dtype=np.float32)
+    components = np.arange(15, dtype=np.float32).reshape(3, 5) / 10
+    pack_path, data, header = _write(tmp_path, projection=(mean, components))
+
+    assert header["full_dim"] == 5
+    assert header["projection"] % BLOCK_ALIGNMENT == 0
+    assert header["projection"] >= header["files"] + header["files_length"]
+    assert len(data) == header["projection"] + 4 * (5 + 3 * 5)
+    store = PackedVectorStore(pack_path)
+    assert np.array_equal(store.projection[0], mean)
+    assert np.array_equal(store.projection[1], components)
+
+def test_unsupported_version_is_rejected(tmp_path):
+    _, data, _ = _write(tmp_path)
+    data = bytearray(data)
+    struct.pack_into("<I", data, 8, PACKED_INDEX_VERSION + 1)
+    with pytest.raises(ValueError, match="Unsupported packed index version"):
+        read_packed_header(bytes(data))
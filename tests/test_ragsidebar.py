@@ -0,0 +1,33 @@
+import pytest
+
+for module in ("PyQt5", "PyPDF2", "langchain", "langchain_community", "langchain_ollama", "numpy", "tqdm"):
+    pytest.importorskip(module)
+
+from langchain_core.documents import Document
+
+from context_compaction import compact_documents
+from RAGsidebar import query_chain
+
+class FakeMemory:
+    def clear(self):
+        pass
+
+class FakeChain:
+    """Stands in for the QA chain, whose source documents are what CompactingRetriever returns."""
+    memory = FakeMemory()
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def invoke(self, inputs):
+        return {"answer": "42", "source_documents": compact_documents(self.docs)}
+
+def test_query_output_names_source_files():
+    docs = [
+        Document(page_content="alpha " * 30, metadata={"source": "3-pl", "file": "/data/reports/alpha.pdf"}),
+        Document(page_content="beta " * 30, metadata={"source": "idxB/7-pl", "file": "/data/beta.csv", "index": "idxB"}),
+    ]
+    output = query_chain(FakeChain(docs), "What is the answer?")
+    assert "Answer: 42" in output
+    assert "Source 1 (alpha.pdf):" in output
+    assert "Source 2 (beta.csv):" in output
@@ -0,0 +1,54 @@
+import io
+import json
+
+import pytest
+
+import record_readers
+from record_readers import iter_csv_chunks, iter_json_array, pack_records
+
+def _split(record, max_size):
+    assert max_size > 0
+    return [record[i:i + max_size] for i in range(0, len(record), max_size)]
+
+def test_wide_csv_header_leaves_room_for_rows(tmp_path):
+    header = ",".join(f"column_{i}" for i in range(40))
+    rows = [",".join(str(i * 40 + j) for j in range(40)) for i in range(5)]
+    csv_path = tmp_path / "wide.csv"
+    csv_path.write_text("\n".join([header] + rows) + "\n", encoding="utf-8")
+
+    chunks = list(iter_csv_chunks(str(csv_path), 100, _split))
+
+    assert chunks
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert all(chunk.startswith("column_0,column_1") for chunk in chunks)
+    body = "".join(chunk.split("\n", 1)[1] for chunk in chunks)
+    assert body == "".join(rows)
+
+def test_header_that_fits_is_kept_whole():
+    chunks = list(pack_records(["1,2", "3,4"], 100, header="a,b"))
+    assert chunks == ["a,b\n1,2\n3,4"]
+
+def test_json_array_numbers_split_across_blocks(monkeypatch):
+    monkeypatch.setattr(record_readers, "READ_BLOCK_SIZE", 3)
+    values = [1.5e10, 123.45, 12e5, -0.25, 7, True, None, "x", {"a": [1, 2.5]}]
+    text = json.dumps(values)
+    for padding in range(4):
+        f = io.StringIO(" " * padding + text[1:])
+        assert list(iter_json_array(f, "[")) == values
+
+def _read_json_array(text, block_size, monkeypatch):
+    monkeypatch.setattr(record_readers, "READ_BLOCK_SIZE", block_size)
+    return list(iter_json_array(io.StringIO(text[1:]), text[0]))
+
+@pytest.mark.parametrize("text", ["[]", " [ ] ", "[1]", "[1, 2]", '[{"a": 1} ,\n"b" ]\n\n', "[[], [1, [2]]]  "])
+@pytest.mark.parametrize("block_size", [1, 3, 1 << 16])
+def test_json_array_accepts_what_json_loads_accepts(text, block_size, monkeypatch):
+    assert _read_json_array(text.lstrip(), block_size, monkeypatch) == json.loads(text)
+
+@pytest.mark.parametrize("text", ["[1 2]", "[1,,2]", "[,1]", "[1,]", "[,]", "[1] 2", "[1]]", "[1] x", "[1", "[1,"])
+@pytest.mark.parametrize("block_size", [1, 3, 1 << 16])
+def test_json_array_rejects_what_json_loads_rejects(text, block_size, monkeypatch):
+    with pytest.raises(ValueError):
+        json.loads(text)
+    with pytest.raises(ValueError):
+        _read_json_array(text, block_size, monkeypatch)